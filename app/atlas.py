@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+import pygame
+
+# Written by build_atlas.py
+ATLAS_PIXELS = "atlas.bin"  # zlib-compressed RGBA pixels of the whole sheet
+ATLAS_INDEX = "atlas.json"  # sheet size and each sprite's rect
+
+
+class Assets:
+    """
+    The game's sprites, loaded once.
+
+    With a built atlas that is one decompress and one convert_alpha() for
+    the whole sheet; sprites are sub-surfaces of it. Without one (running
+    from source before build_atlas.py) each PNG is loaded instead.
+
+    start() loads on a background thread so it overlaps the start screen.
+    get() waits for it if needed, and finishes with the convert_alpha() on
+    the calling thread, since that one needs the display.
+    """
+
+    def __init__(self, assets_dir):
+        self.assets_dir = assets_dir
+        self.thread = None
+        self.sheet = None
+        self.rects = {}
+        self.images = {}  # per-PNG fallback
+        self.cache = {}
+        self.converted = False
+        self.load_seconds = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._load, daemon=True)
+        self.thread.start()
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            self._load_atlas()
+        except (OSError, ValueError, KeyError, zlib.error, pygame.error) as e:
+            print(f"[WARN] No sprite atlas ({e}), loading PNGs one by one")
+            self._load_pngs()
+        self.load_seconds = time.perf_counter() - start
+
+    def _load_atlas(self):
+        with open(os.path.join(self.assets_dir, ATLAS_INDEX)) as f:
+            index = json.load(f)
+        with open(os.path.join(self.assets_dir, ATLAS_PIXELS), "rb") as f:
+            pixels = zlib.decompress(f.read())
+        self.sheet = pygame.image.frombytes(pixels, tuple(index["size"]), "RGBA")
+        self.rects = {name: pygame.Rect(rect) for name, rect in index["sprites"].items()}
+
+    def _load_pngs(self):
+        for name in sorted(os.listdir(self.assets_dir)):
+            if not name.endswith(".png"):
+                continue
+            try:
+                self.images[name] = pygame.image.load(os.path.join(self.assets_dir, name))
+            except Exception as e:
+                print(f"[WARN] {e}")
+
+    def wait(self):
+        if self.thread is None:
+            self._load()
+        else:
+            self.thread.join()
+        if not self.converted:
+            if self.sheet is not None:
+                self.sheet = self.sheet.convert_alpha()
+            self.images = {name: img.convert_alpha() for name, img in self.images.items()}
+            self.converted = True
+
+    def get(self, name, fallback_size=(50, 90)):
+        surf = self.cache.get(name)
+        if surf is None:
+            self.wait()
+            if name in self.rects:
+                surf = self.sheet.subsurface(self.rects[name])
+            elif name in self.images:
+                surf = self.images[name]
+            else:
+                print(f"[WARN] Missing sprite. Placeholder used for {name}")
+                surf = pygame.Surface(fallback_size, pygame.SRCALPHA)
+                surf.fill((200, 80, 80))
+            self.cache[name] = surf
+        return surf
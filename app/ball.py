@@ -23,6 +23,8 @@ class Ball:
         self.vy = -4
 
     def update(self, players):
+        """Step the ball; returns the player it bounced off, if any."""
+        hit = None
         self.vy += self.gravity
         self.rect.x += int(self.vx)
         self.rect.y += int(self.vy)
@@ -64,4 +66,6 @@ class Ball:
                 self.vx, self.vy = normal.x * 8, normal.y * 16
                 
                 # Push ball out to prevent sticking
-                self.rect.center += normal * (self.radius + 5)
\ No newline at end of file
+                self.rect.center += normal * (self.radius + 5)
+                hit = p
+        return hit
@@ -0,0 +1,65 @@
+"""
+Build step: pack every PNG in assets/ into one sprite atlas for atlas.Assets.
+
+Writes assets/atlas.bin (zlib-compressed RGBA pixels) and assets/atlas.json
+(sheet size and the rect of each sprite, keyed by file name). Run it before
+packaging the client:
+
+    cd app
+    python build_atlas.py
+"""
+import json
+import os
+import sys
+import zlib
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+from atlas import ATLAS_INDEX, ATLAS_PIXELS
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+MAX_WIDTH = 512
+PADDING = 1  # keeps neighbours from bleeding into a sprite when it's scaled
+
+
+def pack(sizes, max_width=MAX_WIDTH):
+    """
+    Shelf packing, tallest first: fill a row left to right, start a new row
+    below it when the next sprite doesn't fit. Returns ({name: (x, y, w, h)},
+    (sheet width, sheet height)).
+    """
+    rects = {}
+    x = y = shelf_height = width = 0
+    for name, (w, h) in sorted(sizes.items(), key=lambda item: (-item[1][1], item[0])):
+        if x and x + w > max_width:
+            x, y, shelf_height = 0, y + shelf_height + PADDING, 0
+        rects[name] = (x, y, w, h)
+        x += w + PADDING
+        shelf_height = max(shelf_height, h)
+        width = max(width, x - PADDING)
+    return rects, (width, y + shelf_height)
+
+
+def build(assets_dir=ASSETS_DIR):
+    images = {
+        name: pygame.image.load(os.path.join(assets_dir, name))
+        for name in sorted(os.listdir(assets_dir))
+        if name.endswith(".png")
+    }
+    rects, size = pack({name: img.get_size() for name, img in images.items()})
+    sheet = pygame.Surface(size, pygame.SRCALPHA)
+    for name, img in images.items():
+        sheet.blit(img, rects[name][:2])
+
+    with open(os.path.join(assets_dir, ATLAS_PIXELS), "wb") as f:
+        f.write(zlib.compress(pygame.image.tobytes(sheet, "RGBA"), 9))
+    with open(os.path.join(assets_dir, ATLAS_INDEX), "w") as f:
+        json.dump({"size": list(size), "sprites": {n: list(r) for n, r in rects.items()}}, f)
+    return rects, size
+
+
+if __name__ == "__main__":
+    rects, size = build(sys.argv[1] if len(sys.argv) > 1 else ASSETS_DIR)
+    print(f"packed {len(rects)} sprites into a {size[0]}x{size[1]} atlas")
@@ -1,30 +1,64 @@
-import websocket
 import threading
 import json
+import os
+import secrets
 import uuid
 import time
 
 CLIENT_ID = str(uuid.uuid4())
 
+# Identifies this player to the server across sessions, for the leaderboard
+TOKEN_PATH = os.path.join(os.path.expanduser("~"), ".football_player_token")
+
+
+def player_token():
+    """The token saved by an earlier run, or a new one (saved if possible)."""
+    try:
+        with open(TOKEN_PATH) as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except OSError:
+        pass
+    token = secrets.token_hex(16)
+    try:
+        # Readable by this user only: whoever has it plays as them
+        with open(os.open(TOKEN_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            f.write(token)
+    except OSError as e:
+        print(f"[WARN] Could not save the player token ({e}); ratings won't carry over")
+    return token
+
+
 class WSClient:
     def __init__(self, url):
         self.url = url
         self.ws = None
         self.connected = False
         self.client_id = None  # server assigned
+        self.player_id = None  # server assigned, the same every session
         self.in_game = False
         self.game_id = None
         self.role = None
         self.opponent_connected = False
         self.incoming = []
         self.stop_flag = False
+        self.rtt = None  # seconds, set when a pong arrives
+        self.send_interval_hint = None  # seconds, from the server
+        self.sent = 0  # messages, for the performance HUD
+        self.received = 0
 
     def start(self):
         def run():
+            # Imported on this thread so the game window never waits on it
+            import websocket
+
+            header = [f"X-Player-Token: {player_token()}"]
             while not self.stop_flag:
                 try:
                     self.ws = websocket.WebSocketApp(
                         self.url,
+                        header=header,
                         on_open=self.on_open,
                         on_message=self.on_message,
                         on_close=self.on_close,
@@ -42,6 +76,7 @@ class WSClient:
         # Do not auto-join matchmaking here; let UI send find_game when user presses start.
 
     def on_message(self, ws, message):
+        self.received += 1
         try:
             data = json.loads(message)
         except:
@@ -49,6 +84,16 @@ class WSClient:
         # if server assigns client id, capture it
         if data.get("type") == "connected" and data.get("client_id"):
             self.client_id = data["client_id"]
+            self.player_id = data.get("player_id")
+        if data.get("send_interval"):
+            self.send_interval_hint = data["send_interval"]
+        if data.get("type") == "pong":
+            # Measured here rather than in the game loop, which adds up to a frame
+            try:
+                self.rtt = time.perf_counter() - float(data.get("t"))
+            except (TypeError, ValueError):
+                pass
+            return
         self.incoming.append(data)
 
     def on_close(self, ws, status, msg):
@@ -62,9 +107,14 @@ class WSClient:
         try:
             if self.ws and self.connected:
                 self.ws.send(json.dumps(data))
+                self.sent += 1
         except Exception as e:
             print("WS send error:", e)
 
+    def ping(self, rtt=None):
+        # Our smoothed RTT rides along: the server uses it to rewind kick claims
+        self.send({"action": "ping", "payload": {"t": time.perf_counter(), "rtt": rtt}})
+
     def stop(self):
         self.stop_flag = True
         try:
@@ -1,13 +1,17 @@
 import os
 import sys
 import time
-import random
+
+STARTUP_T0 = time.perf_counter()
+
 import pygame
 import uuid
 
+from atlas import Assets
 from ball import Ball
-from connect import WSClient
+from perfhud import FrameProfiler
 from player import Player
+from sendrate import SendScheduler
 
 
 SERVER_URL="ws://0.0.0.0:3005/ws/game/"
@@ -20,19 +24,22 @@ GRAVITY = 0.6
 ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets")
 CLIENT_ID = str(uuid.uuid4())
 
-last_sent = 0
-SEND_INTERVAL = 0.01  # seconds (100 frames per seconds)
+SEND_INTERVAL = 0.05  # seconds; base rate, adapted to RTT and server hints
+PING_INTERVAL = 2.0  # seconds between RTT probes
+CHAT_MAX_LENGTH = 200  # server rejects longer messages
+PERF_HUD = os.environ.get("PERF_HUD") == "1"  # F3 toggles it in game, F4 records a trace
+
+
+def startup_ms():
+    return (time.perf_counter() - STARTUP_T0) * 1000
 
+def control_state(keys):
+    return (
+        keys[pygame.K_LEFT] or keys[pygame.K_a],
+        keys[pygame.K_RIGHT] or keys[pygame.K_d],
+        keys[pygame.K_UP] or keys[pygame.K_w] or keys[pygame.K_SPACE],
+    )
 
-def load_image(name, fallback_size=(50, 90)):
-    path = os.path.join(ASSETS_DIR, name)
-    try:
-        return pygame.image.load(path).convert_alpha()
-    except Exception as e:
-        print(f"[WARN] {e}. Placeholder used for {name}")
-        surf = pygame.Surface(fallback_size, pygame.SRCALPHA)
-        surf.fill((200, 80, 80))
-        return surf
 
 def draw_text(surf, txt, size, x, y, color=(0,0,0)):
     font = pygame.font.SysFont(None, size)
@@ -41,12 +48,14 @@ def draw_text(surf, txt, size, x, y, color=(0,0,0)):
     surf.blit(img, rect)
 
 
-def start_screen(screen, wsclient):
+def start_screen(screen, wsclient, max_frames=None):
+    """Returns True once matched, False if max_frames ran out first."""
     clock = pygame.time.Clock()
     btn = pygame.Rect(WIDTH//2 - 100, HEIGHT//2 + 40, 200, 50)
     searching = False
     searching_text = "Press Enter or Start to find opponent"
-    while True:
+    frames = 0
+    while max_frames is None or frames < max_frames:
         for e in pygame.event.get():
             if e.type == pygame.QUIT: pygame.quit(); sys.exit()
             if e.type == pygame.KEYDOWN and e.key == pygame.K_RETURN:
@@ -68,12 +77,15 @@ def start_screen(screen, wsclient):
             msg = wsclient.incoming.pop(0)
             if msg.get("type") == "searching":
                 searching = True
+            if msg.get("type") == "server_full":
+                searching = False
+                searching_text = "Server is full, please try again shortly"
             if msg.get("type") == "matched":
                 # got matched: return and start game
                 wsclient.in_game = True
                 wsclient.game_id = msg.get("game_id")
                 wsclient.role = msg.get("role")
-                return  # start actual game
+                return True  # start actual game
         screen.fill((180,230,255))
         draw_text(screen, "Simple Football", 48, WIDTH//2, HEIGHT//2 - 40)
         pygame.draw.rect(screen, (50,150,50), btn)
@@ -83,7 +95,11 @@ def start_screen(screen, wsclient):
         else:
             draw_text(screen, searching_text, 18, WIDTH//2, HEIGHT//2 + 120)
         pygame.display.flip()
+        if frames == 0:
+            print(f"[startup] first frame after {startup_ms():.0f} ms")
+        frames += 1
         clock.tick(FPS)
+    return False
 
 
 def game_over(screen, left_score, right_score, my_role):
@@ -125,20 +141,36 @@ def main():
     pygame.display.set_caption("Football Multiplayer")
     clock = pygame.time.Clock()
 
-    # Create and start websocket client
+    # Sprites load in the background while the start screen is up
+    assets = Assets(ASSETS_DIR)
+    assets.start()
+
+    # Create and start websocket client. Imported here so the window
+    # doesn't wait on the network stack.
+    from connect import WSClient
     ws = WSClient(SERVER_URL)
     ws.start()
 
+    if "--startup-time" in sys.argv:
+        # Draw one start screen frame, wait for the sprites, report and quit
+        start_screen(screen, ws, max_frames=1)
+        assets.wait()
+        print(f"[startup] sprites loaded in {assets.load_seconds * 1000:.0f} ms, "
+              f"ready after {startup_ms():.0f} ms")
+        ws.stop()
+        pygame.quit()
+        return
+
     # Wait on start screen until match found
     start_screen(screen, ws)
 
     # Matched: setup assets
     print("Matched! Starting game...")
-    p_left = load_image("player_left.png")
-    p_right = load_image("player_right.png")
-    ball_img = load_image("ball.png", (30, 30))
-    goal_left = load_image("goal_left.png", (22, 140))
-    goal_right = load_image("goal_right.png", (22, 140))
+    p_left = assets.get("player_left.png")
+    p_right = assets.get("player_right.png")
+    ball_img = assets.get("ball.png", (30, 30))
+    goal_left = assets.get("goal_left.png", (22, 140))
+    goal_right = assets.get("goal_right.png", (22, 140))
 
     g_left_rect = goal_left.get_rect(midleft=(0, HEIGHT - GROUND_HEIGHT - goal_left.get_height() // 2))
     g_right_rect = goal_right.get_rect(midright=(WIDTH, HEIGHT - GROUND_HEIGHT - goal_right.get_height() // 2))
@@ -153,8 +185,10 @@ def main():
 
     lscore = rscore = 0
     start_t = time.time()
-    last_sent = 0
-    SEND_INTERVAL = 0.05  # smoother network updates
+    sender = SendScheduler(base_interval=SEND_INTERVAL)
+    last_controls = (False, False, False)
+    last_ping = 0
+    prof = FrameProfiler(enabled=PERF_HUD)
 
     # Chat input
     chat_input = ""
@@ -164,17 +198,25 @@ def main():
     running = True
     while running:
         dt = clock.tick(FPS) / 1000
+        prof.begin()
         tleft = GAME_SECONDS - int(time.time() - start_t)
 
         # Handle Events
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
                 ws.send({"action": "leave_game", "payload": {"player_id": ws.client_id}})
+                if prof.tracing:
+                    print(f"[perf] trace written to {prof.toggle_trace()}")
                 ws.stop()
                 pygame.quit()
                 sys.exit()
             elif e.type == pygame.KEYDOWN:
-                if e.key == pygame.K_SLASH:
+                if e.key == pygame.K_F3:
+                    prof.toggle()
+                elif e.key == pygame.K_F4:
+                    path = prof.toggle_trace()
+                    print(f"[perf] trace written to {path}" if path else "[perf] recording trace, F4 to stop")
+                elif e.key == pygame.K_SLASH:
                     # Toggle chat mode
                     chat_active = not chat_active
                     if not chat_active:
@@ -196,7 +238,8 @@ def main():
                         chat_active = False
                     else:
                         # Only accept printable ASCII characters
-                        if e.unicode.isprintable() and e.key != pygame.K_SLASH:
+                        if e.unicode.isprintable() and e.key != pygame.K_SLASH \
+                                and len(chat_input) < CHAT_MAX_LENGTH:
                             chat_input += e.unicode
                 else:
                     # Game controls only when chat is not active
@@ -204,16 +247,27 @@ def main():
                         running = False
                         ws.send({"action": "leave_game", "payload": {"player_id": ws.client_id}})
 
+        prof.mark("input")
+
         # Update controllable player (only when chat is not active)
+        input_edge = False
         if not chat_active:
             keys = pygame.key.get_pressed()
+            controls = control_state(keys)
+            input_edge = controls != last_controls
+            last_controls = controls
             if ws.role == "left":
                 left.update(keys)
             else:
                 right.update(keys)
+        prof.mark("player")
 
-        # Ball collision logic (local)
-        ball.update([left, right])
+        # Ball collision logic (local). Our own kicks go out right away and
+        # are flagged, so the server checks them against the ball we saw.
+        my_player = left if ws.role == "left" else right
+        kicked = ball.update([left, right]) is my_player
+        if kicked:
+            input_edge = True
 
         # Goal detection
         if ball.rect.colliderect(g_left_rect):
@@ -223,6 +277,7 @@ def main():
                 "payload": {"left": lscore, "right": rscore}
             })
             ball.reset()
+            input_edge = True
         elif ball.rect.colliderect(g_right_rect):
             lscore += 1
             ws.send({
@@ -230,29 +285,42 @@ def main():
                 "payload": {"left": lscore, "right": rscore}
             })
             ball.reset()
+            input_edge = True
+        prof.mark("ball")
 
-        # Send updates to server
+        # Send updates to server: on input edges, otherwise only when
+        # something moved, at a rate adapted to RTT and server hints
         now = time.time()
-        if ws.in_game and now - last_sent > SEND_INTERVAL:
-            last_sent = now
-            my_player = left if ws.role == "left" else right
-            ws.send({
-                "action": "update",
-                "payload": {
-                    "player_id": ws.client_id,
-                    "pos": {"x": my_player.rect.x, "y": my_player.rect.y},
-                    "vx": my_player.vx,
-                    "vy": my_player.vy,
-                    "ball": {
-                        "x": ball.rect.centerx,
-                        "y": ball.rect.centery,
-                        "vx": ball.vx,
-                        "vy": ball.vy,
-                    },
-                }
-            })
+        if now - last_ping > PING_INTERVAL:
+            last_ping = now
+            ws.ping(sender.rtt)
+        sender.set_hint(ws.send_interval_hint)
+        if ws.rtt is not None:
+            sender.note_rtt(ws.rtt)
+            ws.rtt = None
+        state = (my_player.rect.x, my_player.rect.y, my_player.vx, my_player.vy,
+                 ball.rect.centerx, ball.rect.centery, ball.vx, ball.vy)
+        if ws.in_game and sender.should_send(now, state, input_edge):
+            sender.mark_sent(now, state)
+            payload = {
+                "player_id": ws.client_id,
+                "pos": {"x": my_player.rect.x, "y": my_player.rect.y},
+                "vx": my_player.vx,
+                "vy": my_player.vy,
+                "ball": {
+                    "x": ball.rect.centerx,
+                    "y": ball.rect.centery,
+                    "vx": ball.vx,
+                    "vy": ball.vy,
+                },
+            }
+            if kicked:
+                payload["kick"] = True
+            ws.send({"action": "update", "payload": payload})
+        prof.mark("send")
 
         # Process incoming messages
+        prof.sample_network(ws, sender.rtt)
         while ws.incoming:
             msg = ws.incoming.pop(0)
             t = msg.get("type")
@@ -309,12 +377,20 @@ def main():
                 if len(chat_messages) > 5:
                     chat_messages.pop(0)
 
+            elif t == "chat_rejected":
+                reason = msg.get("reason", "")
+                chat_messages.append("Message not sent: too long" if reason == "too_long"
+                                     else "Message not sent: slow down")
+                if len(chat_messages) > 5:
+                    chat_messages.pop(0)
+
             elif t == "player_left":
                 draw_text(screen, "Opponent Left the Game", 30, WIDTH // 2, HEIGHT // 2)
                 pygame.display.flip()
                 ws.opponent_connected = False
                 time.sleep(2)
                 running = False
+        prof.mark("drain")
 
         # End game if timer finished
         if tleft <= 0:
@@ -349,7 +425,12 @@ def main():
             # Show instruction to open chat
             draw_text(screen, "Press / to chat", 16, WIDTH // 2, HEIGHT - 15, (200, 200, 200))
 
+        prof.draw(screen)
         pygame.display.flip()
+        prof.mark("render")
+
+    if prof.tracing:
+        print(f"[perf] trace written to {prof.toggle_trace()}")
 
     # Game Over - pass role to determine winner correctly
     game_over(screen, lscore, rscore, ws.role)
@@ -0,0 +1,176 @@
+import json
+import time
+from collections import deque
+
+import pygame
+
+# Where a frame's time goes, in the order the game loop runs them
+SECTIONS = ("input", "player", "ball", "send", "drain", "render")
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+class FrameProfiler:
+    """
+    Per-frame timings for the game loop, plus an overlay and a log.
+
+    The loop calls begin() at the start of each frame and mark(section) as
+    it finishes each part: the time since the previous mark is charged to
+    that section. What the loop doesn't mark (the wait in clock.tick) shows
+    up as the gap between frame time and work time.
+
+    Timings are always collected for the last ``window`` frames; it costs a
+    perf_counter() call per section. toggle() shows the overlay and logs a
+    summary every ``log_interval`` seconds. toggle_trace() records every
+    frame until toggled again, then writes a Chrome trace file: open it in
+    chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self, window=300, log_interval=5.0, enabled=False):
+        self.enabled = enabled
+        self.log_interval = log_interval
+        self.frames = deque(maxlen=window)  # start-to-start frame times
+        self.work = deque(maxlen=window)  # time spent in marked sections
+        self.sections = {name: deque(maxlen=window) for name in SECTIONS}
+        self.current = dict.fromkeys(SECTIONS, 0.0)
+        self.frame_start = None
+        self.last_mark = None
+        self.last_log = time.perf_counter()
+        self.trace = None  # (section, start, end) while recording
+        self.counters = []  # (time, queue depth, rtt) while recording
+        self.trace_origin = 0.0
+        self.queue_depth = 0
+        self.rtt = None
+        self.rates = (0.0, 0.0)  # messages sent, received per second
+        self._counts = None  # (time, sent, received) at the last rate sample
+        self._rendered = []
+        self._backdrop = None
+        self._font = None
+        self._next_render = 0.0
+
+    def begin(self):
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self._end_frame(now)
+        self.frame_start = self.last_mark = now
+
+    def mark(self, section):
+        now = time.perf_counter()
+        self.current[section] += now - self.last_mark
+        if self.trace is not None:
+            self.trace.append((section, self.last_mark, now))
+        self.last_mark = now
+
+    def _end_frame(self, now):
+        self.frames.append(now - self.frame_start)
+        work = 0.0
+        for name in SECTIONS:
+            self.sections[name].append(self.current[name])
+            work += self.current[name]
+            self.current[name] = 0.0
+        self.work.append(work)
+        if self.trace is not None:
+            self.trace.append(("frame", self.frame_start, now))
+        if self.enabled and now - self.last_log >= self.log_interval:
+            self.last_log = now
+            print("[perf] " + " | ".join(self.summary()))
+
+    def sample_network(self, wsclient, rtt):
+        """Queue depth, message rates and RTT, read once per frame."""
+        now = time.perf_counter()
+        self.queue_depth = len(wsclient.incoming)
+        self.rtt = rtt
+        if self._counts is None:
+            self._counts = (now, wsclient.sent, wsclient.received)
+        elif now - self._counts[0] >= 1.0:
+            then, sent, received = self._counts
+            elapsed = now - then
+            self.rates = ((wsclient.sent - sent) / elapsed, (wsclient.received - received) / elapsed)
+            self._counts = (now, wsclient.sent, wsclient.received)
+        if self.trace is not None:
+            self.counters.append((now, self.queue_depth, rtt))
+
+    def summary(self):
+        frames = list(self.frames)
+        mean = sum(frames) / len(frames) if frames else 0.0
+        fps = 1 / mean if mean else 0.0
+        split = "  ".join(
+            f"{name} {sum(values) / len(values) * 1000:.2f}"
+            for name, values in self.sections.items() if values
+        )
+        rtt = f"{self.rtt * 1000:.0f} ms" if self.rtt is not None else "-"
+        return [
+            f"{fps:.0f} fps  frame p50 {percentile(frames, 50) * 1000:.1f} "
+            f"p95 {percentile(frames, 95) * 1000:.1f} p99 {percentile(frames, 99) * 1000:.1f} ms",
+            f"work p95 {percentile(self.work, 95) * 1000:.2f} ms  ({split})",
+            f"queue {self.queue_depth}  send {self.rates[0]:.0f}/s  recv {self.rates[1]:.0f}/s  rtt {rtt}",
+        ]
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self._next_render = 0.0
+
+    def draw(self, surf):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if now >= self._next_render:
+            # Text is re-rendered a few times a second, not every frame
+            self._next_render = now + 0.25
+            if self._font is None:
+                self._font = pygame.font.SysFont("monospace", 14)
+            self._rendered = [self._font.render(line, True, (255, 255, 255)) for line in self.summary()]
+            width = max(img.get_width() for img in self._rendered) + 8
+            self._backdrop = pygame.Surface((width, len(self._rendered) * 16 + 6), pygame.SRCALPHA)
+            self._backdrop.fill((0, 0, 0, 160))
+        surf.blit(self._backdrop, (4, 4))
+        for i, img in enumerate(self._rendered):
+            surf.blit(img, (8, 7 + i * 16))
+
+    # Trace
+    @property
+    def tracing(self):
+        return self.trace is not None
+
+    def toggle_trace(self, path=None):
+        """Start recording, or stop and write the trace. Returns the path written, if any."""
+        if self.trace is None:
+            self.trace = []
+            self.counters = []
+            self.trace_origin = time.perf_counter()
+            return None
+        path = path or time.strftime("frametrace-%Y%m%d-%H%M%S.json")
+        self.dump_trace(path)
+        self.trace = None
+        return path
+
+    def dump_trace(self, path):
+        origin = self.trace_origin
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 1,
+                "tid": 1 if name == "frame" else 2,
+            }
+            for name, start, end in self.trace or ()
+        ]
+        events.extend(
+            {
+                "name": "network",
+                "ph": "C",
+                "ts": (t - origin) * 1e6,
+                "pid": 1,
+                "args": {"queue": depth, "rtt_ms": rtt * 1000 if rtt is not None else 0},
+            }
+            for t, depth, rtt in self.counters
+        )
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,63 @@
+class SendScheduler:
+    """
+    Decides when the client sends an `update`.
+
+    - Input edges (a control key pressed or released) go out right away.
+    - Otherwise at most once per `interval`, and only if the state moved
+      more than `tolerance` since the last send.
+    - An unchanged state is still re-sent every `idle_interval` as a keepalive.
+
+    The interval starts at `base_interval`, follows the server's hint, and
+    grows with RTT: sending much faster than a quarter of the round trip
+    only makes packets arrive in bunches.
+    """
+
+    def __init__(self, base_interval=0.05, min_interval=0.02, max_interval=0.2,
+                 idle_interval=0.5, tolerance=0.5):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.tolerance = tolerance
+        self.hint = None
+        self.rtt = None
+        self.last_sent = 0.0
+        self.last_state = None
+        self.sent = 0
+        self.skipped = 0
+
+    @property
+    def interval(self):
+        interval = self.hint if self.hint else self.base_interval
+        if self.rtt is not None:
+            interval = max(interval, self.rtt / 4)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def note_rtt(self, rtt):
+        # Smoothed like TCP's SRTT so one slow pong doesn't swing the rate
+        self.rtt = rtt if self.rtt is None else self.rtt * 0.875 + rtt * 0.125
+
+    def set_hint(self, interval):
+        if interval:
+            self.hint = float(interval)
+
+    def changed(self, state):
+        if self.last_state is None or len(state) != len(self.last_state):
+            return True
+        return any(abs(a - b) > self.tolerance for a, b in zip(state, self.last_state))
+
+    def should_send(self, now, state, input_edge=False):
+        if input_edge:
+            return True
+        elapsed = now - self.last_sent
+        if elapsed < self.interval:
+            return False
+        if self.changed(state) or elapsed >= self.idle_interval:
+            return True
+        self.skipped += 1
+        return False
+
+    def mark_sent(self, now, state):
+        self.last_sent = now
+        self.last_state = state
+        self.sent += 1
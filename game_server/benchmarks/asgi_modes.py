@@ -0,0 +1,88 @@
+"""
+Full ASGI stack (game_server.asgi) vs the lean game-only one (game_server.asgi_game).
+
+For each mode, in a fresh interpreter:
+    startup   - time to import the ASGI module and be ready to route a socket
+    connects  - websocket connect + "connected" frame + disconnect per second
+
+The channel layer is swapped for the in-memory one so only the ASGI stack
+and the consumer are measured; the consumer still uses the configured
+GAME_STORE (run with SINGLE_NODE=1 to leave Redis out entirely).
+
+Usage (from game_server/):
+    python benchmarks/asgi_modes.py [connections] [startup runs]
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "full": ("game_server.asgi", "game_server.settings"),
+    "lean": ("game_server.asgi_game", "game_server.settings_game"),
+}
+
+
+def _load(mode):
+    module_name, settings_module = MODES[mode]
+    os.environ["DJANGO_SETTINGS_MODULE"] = settings_module
+    sys.path.insert(0, ROOT)
+    start = time.perf_counter()
+    module = __import__(module_name, fromlist=["application"])
+    if hasattr(module, "get_router"):
+        module.get_router()
+    return module.application, time.perf_counter() - start
+
+
+async def _connects(application, count):
+    from channels.testing import WebsocketCommunicator
+
+    start = time.perf_counter()
+    for _ in range(count):
+        communicator = WebsocketCommunicator(application, "/ws/game/")
+        connected, _ = await communicator.connect()
+        assert connected
+        await communicator.receive_json_from()
+        await communicator.disconnect()
+    return count / (time.perf_counter() - start)
+
+
+def worker(mode, action, count):
+    application, startup = _load(mode)
+    if action == "startup":
+        print(startup)
+        return
+    from django.conf import settings
+
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    print(asyncio.run(_connects(application, count)))
+
+
+def _run(mode, action, count):
+    out = subprocess.run(
+        [sys.executable, __file__, "--worker", mode, action, str(count)],
+        check=True, capture_output=True, text=True, cwd=ROOT,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main(connections, startup_runs):
+    print(f"{'mode':<6} {'startup ms':>11} {'connects/s':>11}")
+    for mode in MODES:
+        startup = statistics.median(_run(mode, "startup", 0) for _ in range(startup_runs))
+        rate = _run(mode, "connects", connections)
+        print(f"{mode:<6} {startup * 1000:>11.1f} {rate:>11.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+        )
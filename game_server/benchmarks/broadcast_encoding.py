@@ -0,0 +1,73 @@
+"""
+Serialization CPU per game.update broadcast, per-recipient vs encode-once.
+
+For 2, 10 and 100 recipients, runs GameConsumer.game_update on every
+recipient for one broadcast event:
+    per-recipient  - event carries the payload, each handler json-encodes it
+    encode-once    - sender encodes the frame once, handlers forward it
+
+Usage (from game_server/):
+    python benchmarks/broadcast_encoding.py [broadcasts]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game_server.settings")
+
+import django
+
+django.setup()
+
+from common import make_consumer
+from core.consumers import encode
+
+PAYLOAD = {
+    "player_id": "3f1c2d4e-5a6b-4c7d-8e9f-0a1b2c3d4e5f",
+    "pos": {"x": 110, "y": 290},
+    "vx": 5,
+    "vy": -11.4,
+    "ball": {"x": 450, "y": 160, "vx": 4.0, "vy": -3.4},
+}
+FROM = PAYLOAD["player_id"]
+
+
+def _recipients(count):
+    return [make_consumer() for _ in range(count)]
+
+
+async def _per_recipient(consumers, broadcasts):
+    start = time.process_time()
+    for _ in range(broadcasts):
+        event = {"type": "game.update", "payload": PAYLOAD, "from": FROM}
+        for consumer in consumers:
+            await consumer.game_update(event)
+    return (time.process_time() - start) / broadcasts * 1e6
+
+
+async def _encode_once(consumers, broadcasts):
+    start = time.process_time()
+    for _ in range(broadcasts):
+        frame = encode({"type": "update", "payload": PAYLOAD, "from": FROM})
+        event = {"type": "game.update", "from": FROM, "frame": frame}
+        for consumer in consumers:
+            await consumer.game_update(event)
+    return (time.process_time() - start) / broadcasts * 1e6
+
+
+async def main(broadcasts):
+    print(f"{'recipients':>10} {'per-recipient us':>17} {'encode-once us':>15} {'saved':>7}")
+    for count in (2, 10, 100):
+        consumers = _recipients(count)
+        runs = max(100, broadcasts // count)
+        await _per_recipient(consumers, 100)  # warm up
+        per_recipient = await _per_recipient(consumers, runs)
+        once = await _encode_once(consumers, runs)
+        saved = (per_recipient - once) / per_recipient * 100
+        print(f"{count:>10} {per_recipient:>17.1f} {once:>15.1f} {saved:>6.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,20 @@
+"""Helpers shared by the benchmark scripts. Import after django.setup()."""
+
+
+async def discard(text_data=None, bytes_data=None, close=False):
+    pass
+
+
+def make_consumer(store=None, max_frames=64):
+    """
+    A GameConsumer set up the way connect() sets up a real connection, whose
+    frames go nowhere. Its outbound queue is not started: until it is, game
+    snapshots just replace each other in the queue.
+    """
+    from core.consumers import GameConsumer
+    from core.outbound import OutboundQueue
+    from core.store import MemoryStore
+
+    consumer = GameConsumer()
+    consumer.setup_connection(store or MemoryStore(), OutboundQueue(discard, max_frames=max_frames))
+    return consumer
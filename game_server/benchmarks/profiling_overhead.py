@@ -0,0 +1,85 @@
+"""
+Cost of the profiling hooks in GameConsumer.dispatch.
+
+Runs a game.update event through three paths:
+    bare      - GameConsumer.dispatch's handler lookup with no profiling hook
+    disabled  - GameConsumer.dispatch with profiling off
+    enabled   - GameConsumer.dispatch with profiling on
+
+Usage (from game_server/):
+    python benchmarks/profiling_overhead.py [iterations]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game_server.settings")
+
+import django
+
+django.setup()
+
+from channels.consumer import get_handler_name
+
+from common import make_consumer
+from core.consumers import GameConsumer
+from core.profiling import profiler
+
+EVENT = {
+    "type": "game.update",
+    "payload": {
+        "player_id": "bench",
+        "pos": {"x": 110, "y": 290},
+        "vx": 5,
+        "vy": 0,
+        "ball": {"x": 450, "y": 160, "vx": 4.0, "vy": -3.4},
+    },
+    "from": "bench",
+}
+
+
+ROUNDS = 5
+
+
+async def _bare_dispatch(consumer, message):
+    # GameConsumer.dispatch without the profiler.enabled check
+    handler = getattr(consumer, get_handler_name(message), None)
+    if handler is None:
+        raise ValueError("No handler for message type %s" % message["type"])
+    return await handler(message)
+
+
+async def _time(dispatch, consumer, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await dispatch(consumer, EVENT)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main(iterations):
+    consumer = make_consumer()
+
+    async def run(enabled, dispatch):
+        profiler.enabled = enabled
+        try:
+            return await _time(dispatch, consumer, iterations // ROUNDS)
+        finally:
+            profiler.enabled = False
+
+    await _time(GameConsumer.dispatch, consumer, 1000)  # warm up
+    # Interleaved rounds, best of each: noise only ever makes a run slower
+    bare = disabled = enabled = float("inf")
+    for _ in range(ROUNDS):
+        bare = min(bare, await run(False, _bare_dispatch))
+        disabled = min(disabled, await run(False, GameConsumer.dispatch))
+        enabled = min(enabled, await run(True, GameConsumer.dispatch))
+
+    print(f"{'path':<10} {'us/event':>10} {'overhead':>10}")
+    for name, us in (("bare", bare), ("disabled", disabled), ("enabled", enabled)):
+        print(f"{name:<10} {us:>10.2f} {(us - bare) / bare * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,78 @@
+"""
+How many match rooms one worker can tick, and how steadily.
+
+Hosts N rooms on a RoomManager against the in-memory store and channel
+layer. A fraction of them get a player update every 50 ms, like a match
+in play; the rest go idle and drop to ROOM_IDLE_TICK_HZ. After a warm-up,
+reports ticks per second, tick CPU, how late ticks ran and the process's
+CPU use. Tick CPU only covers tick() itself; the store writes and
+spectator sends it starts are in the process figure.
+
+Usage (from game_server/):
+    python benchmarks/rooms.py [rooms] [active fraction] [seconds]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game_server.settings")
+
+import django
+from django.conf import settings
+
+django.setup()
+
+from common import make_consumer
+
+
+async def _host(count, active_fraction, seconds):
+    from channels.layers import InMemoryChannelLayer
+
+    from core.rooms import RoomManager
+
+    manager = RoomManager()
+    member = make_consumer()
+    member.channel_layer = InMemoryChannelLayer()
+    rooms = [manager.join(f"bench-{i}", member) for i in range(count)]
+    active = rooms[:int(count * active_fraction)]
+
+    async def players():
+        step = 0
+        while True:
+            step += 1
+            for room in active:
+                room.record({"player:p:x": str(step), "player:p:y": "285"})
+            await asyncio.sleep(0.05)
+
+    driver = asyncio.ensure_future(players())
+    await asyncio.sleep(settings.ROOM_IDLE_SECONDS + 1)  # let the idle rooms slow down
+    for room in rooms:
+        room.ticks = room.skipped = 0
+        room.tick_cpu = room.total_late = room.max_late = 0.0
+    cpu_start, start = time.process_time(), time.perf_counter()
+    await asyncio.sleep(seconds)
+    cpu, elapsed = time.process_time() - cpu_start, time.perf_counter() - start
+    driver.cancel()
+
+    ticks = sum(room.ticks for room in rooms)
+    late = [room.total_late / room.ticks * 1000 for room in rooms if room.ticks]
+    print(f"rooms {count} ({len(active)} active)  {ticks / elapsed:,.0f} ticks/s")
+    print(f"tick CPU {sum(room.tick_cpu for room in rooms) / ticks * 1e6:.1f} us/tick, "
+          f"process CPU {cpu / elapsed:.0%}")
+    print(f"lateness per room mean: p50 {statistics.median(late):.2f} ms  "
+          f"max {max(room.max_late for room in rooms) * 1000:.2f} ms  "
+          f"skipped ticks {sum(room.skipped for room in rooms)}")
+    for room in rooms:
+        manager.leave(room, member)
+
+
+if __name__ == "__main__":
+    asyncio.run(_host(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 0.25,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 5.0,
+    ))
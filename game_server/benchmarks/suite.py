@@ -0,0 +1,323 @@
+"""
+Benchmark suite for the physics and consumer hot paths, with regression gates.
+
+Cases (higher is better, all in operations per second):
+    ball_update         Ball.update steps, players out of reach
+    player_update       Player.update steps with a key held down
+    ball_collisions     Ball.update steps with the ball inside a player
+    handle_update       GameConsumer.handle_update calls
+    find_match          two-player matches made through find_match
+    json_encode         encode of a typical update frame
+    json_decode         decode of a typical update frame
+
+Consumer cases run against the in-memory store and channel layer, so no
+Redis is needed.
+
+Usage (from game_server/):
+    python benchmarks/suite.py                 # run and compare with the baseline
+    python benchmarks/suite.py --save          # run and write the baseline
+    python benchmarks/suite.py -k ball --threshold 0.2
+
+The baseline (benchmarks/baseline.json by default) maps each case to its
+ops/s and an optional per-case "threshold" overriding --threshold. The
+run exits with status 1 if any case is slower than baseline * (1 - threshold).
+Baselines are machine specific: save one on the machine that runs the gate.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+APP_DIR = os.path.join(os.path.dirname(ROOT), "app")
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game_server.settings")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import django
+from django.conf import settings
+
+django.setup()
+
+from common import make_consumer
+
+settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+settings.GAME_STORE = {"BACKEND": "core.store.MemoryStore"}
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+UPDATE_FRAME = {
+    "type": "update",
+    "payload": {
+        "player_id": "3f1c2d4e-5a6b-4c7d-8e9f-0a1b2c3d4e5f",
+        "pos": {"x": 110, "y": 290},
+        "vx": 5,
+        "vy": -11.4,
+        "ball": {"x": 450, "y": 160, "vx": 4.0, "vy": -3.4},
+    },
+    "from": "3f1c2d4e-5a6b-4c7d-8e9f-0a1b2c3d4e5f",
+}
+
+
+def _measure(step, min_time):
+    """Call ``step(n)`` with growing n until it takes min_time; return ops/s."""
+    n = 1
+    while True:
+        start = time.perf_counter()
+        step(n)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return n / elapsed
+        n *= 2 if elapsed < min_time / 4 else 1.5
+        n = int(n) + 1
+
+
+# Physics
+
+def _sprites():
+    import pygame
+
+    from ball import Ball
+    from player import Player
+
+    player_img = pygame.Surface((50, 90))
+    ball_img = pygame.Surface((30, 30))
+    left = Player(player_img, 110, 380, controllable=True)
+    right = Player(player_img, 790, 380)
+    ball = Ball(ball_img, 450, 160)
+    return ball, left, right
+
+
+def bench_ball_update(min_time):
+    ball, left, right = _sprites()
+    players = [left, right]
+
+    def step(n):
+        for _ in range(n):
+            ball.update(players)
+            # Keep it bouncing in the middle, clear of the players
+            if ball.vy == 0:
+                ball.reset()
+            ball.rect.centerx = 450
+    return _measure(step, min_time)
+
+
+def bench_player_update(min_time):
+    import pygame
+
+    _, left, _ = _sprites()
+    # Stands in for pygame.key.get_pressed(): right and jump held
+    keys = defaultdict(bool, {pygame.K_RIGHT: True, pygame.K_UP: True})
+
+    def step(n):
+        for _ in range(n):
+            left.update(keys)
+            if left.rect.right >= left.width:
+                left.rect.x = 0
+    return _measure(step, min_time)
+
+
+def bench_ball_collisions(min_time):
+    ball, left, right = _sprites()
+    players = [left, right]
+
+    def step(n):
+        for _ in range(n):
+            ball.rect.center = left.rect.center
+            ball.update(players)
+    return _measure(step, min_time)
+
+
+# Consumer
+
+async def _consumer(layer, store):
+    consumer = make_consumer(store, max_frames=10 ** 9)
+    consumer.channel_layer = layer
+    consumer.channel_name = await layer.new_channel()
+    consumer.outbound.start()
+    await layer.group_add(f"player_{consumer.client_id}", consumer.channel_name)
+    return consumer
+
+
+def _run_async(factory, min_time):
+    """Like _measure, for an async ``step(n)`` built by ``await factory()``."""
+    async def main():
+        step = await factory()
+        n = 1
+        while True:
+            start = time.perf_counter()
+            await step(n)
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                return n / elapsed
+            n = int(n * (2 if elapsed < min_time / 4 else 1.5)) + 1
+    return asyncio.run(main())
+
+
+def bench_handle_update(min_time):
+    from channels.layers import InMemoryChannelLayer
+
+    from core.store import MemoryStore
+
+    async def factory():
+        # Small capacity: the peers never read, so their queues stay full
+        # and group_send drops frames instead of growing them
+        layer = InMemoryChannelLayer(capacity=1)
+        store = MemoryStore()
+        consumer = await _consumer(layer, store)
+        await consumer.join_room("bench")
+        payload = UPDATE_FRAME["payload"]
+
+        async def step(n):
+            for _ in range(n):
+                await consumer.handle_update(payload)
+        return step
+    return _run_async(factory, min_time)
+
+
+def bench_find_match(min_time):
+    from channels.layers import InMemoryChannelLayer
+
+    from core.store import MemoryStore
+
+    async def factory():
+        layer = InMemoryChannelLayer(capacity=1)
+        store = MemoryStore()
+        first, second = await _consumer(layer, store), await _consumer(layer, store)
+
+        async def step(n):
+            for _ in range(n):
+                first.game_id = second.game_id = None
+                await first.find_match()
+                await second.find_match()
+                await second.leave_room()
+        return step
+    return _run_async(factory, min_time)
+
+
+# Serialization
+
+def bench_json_encode(min_time):
+    from core.consumers import encode
+
+    def step(n):
+        for _ in range(n):
+            encode(UPDATE_FRAME)
+    return _measure(step, min_time)
+
+
+def bench_json_decode(min_time):
+    frame = json.dumps(UPDATE_FRAME)
+
+    def step(n):
+        for _ in range(n):
+            json.loads(frame)
+    return _measure(step, min_time)
+
+
+CASES = {
+    "ball_update": bench_ball_update,
+    "player_update": bench_player_update,
+    "ball_collisions": bench_ball_collisions,
+    "handle_update": bench_handle_update,
+    "find_match": bench_find_match,
+    "json_encode": bench_json_encode,
+    "json_decode": bench_json_decode,
+}
+
+
+def run(names, min_time, repeat):
+    results = {}
+    for name in names:
+        # Best of several runs: noise only ever makes a run slower
+        results[name] = max(CASES[name](min_time) for _ in range(repeat))
+    return results
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, previous=None):
+    cases = {}
+    for name, ops in results.items():
+        entry = {"ops_per_sec": round(ops, 1)}
+        # Keep hand-tuned per-case thresholds across re-saves
+        old = (previous or {}).get("cases", {}).get(name, {})
+        if "threshold" in old:
+            entry["threshold"] = old["threshold"]
+        cases[name] = entry
+    if previous:
+        for name, entry in previous.get("cases", {}).items():
+            cases.setdefault(name, entry)
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": dict(sorted(cases.items())),
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold):
+    """Print a report; return the names of cases that regressed."""
+    regressions = []
+    print(f"{'case':<18} {'ops/s':>14} {'baseline':>14} {'change':>8}")
+    for name, ops in results.items():
+        entry = (baseline or {}).get("cases", {}).get(name)
+        if entry is None:
+            print(f"{name:<18} {ops:>14,.0f} {'-':>14} {'-':>8}")
+            continue
+        base = entry["ops_per_sec"]
+        change = (ops - base) / base
+        limit = entry.get("threshold", threshold)
+        flag = ""
+        if change < -limit:
+            regressions.append(name)
+            flag = f"  REGRESSION (limit -{limit:.0%})"
+        print(f"{name:<18} {ops:>14,.0f} {base:>14,.0f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", dest="filter", help="only run cases whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="allowed slowdown as a fraction (default 0.15)")
+    parser.add_argument("--min-time", type=float, default=0.3, help="seconds per measurement")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    names = [name for name in CASES if not args.filter or args.filter in name]
+    results = run(names, args.min_time, args.repeat)
+    baseline = load_baseline(args.baseline)
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save:
+        save_baseline(args.baseline, results, baseline)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; run with --save to create one")
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline allows: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,14 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import MatchResult, PlayerMatchStats
+
+
+class PlayerMatchStatsInline(admin.TabularInline):
+    model = PlayerMatchStats
+    extra = 0
+
+
+@admin.register(MatchResult)
+class MatchResultAdmin(admin.ModelAdmin):
+    list_display = ("game_id", "score_left", "score_right", "ended_at")
+    inlines = [PlayerMatchStatsInline]
@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from . import chat, leaderboard, profiling
+        from .results import result_writer
+        from .rooms import room_manager
+
+        chat.load_filter()
+        profiling.configure(
+            enabled=getattr(settings, "PROFILING_ENABLED", False),
+            slow_ms=getattr(settings, "PROFILING_SLOW_MS", 50.0),
+        )
+        profiling.reporters.append(room_manager.log_report)
+        profiling.install_signal_handlers()
+        if getattr(settings, "LEADERBOARD_ENABLED", True):
+            result_writer.listeners.append(leaderboard.apply_results)
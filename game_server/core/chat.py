@@ -1,7 +1,168 @@
-# filter.py
-def filter_chat(text: str) -> str:
+# chat.py
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+class ChatFilter:
+    """
+    Aho-Corasick matcher built once from a word list.
+    Scans a message in a single pass, so cost is linear in the message
+    length no matter how many words are banned.
     """
-    Placeholder chat filter function.
-    Returns the same text for now; implement your filtering logic here.
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]  # lengths of the words ending at each node
+        for word in words:
+            self._add(word.strip().lower())
+        self._build()
+
+    def _add(self, word):
+        if not word:
+            return
+        node = 0
+        for ch in word:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            node = nxt
+        self.out[node] = self.out[node] + (len(word),)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def matches(self, text):
+        """Yield (start, end) spans of whole-word matches in ``text``."""
+        goto, fail, out = self.goto, self.fail, self.out
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Some characters lowercase to several; keep spans aligned with ``text``
+            lowered = "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+        node = 0
+        for i, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length in out[node]:
+                start = i - length + 1
+                # Only whole words, so "class" is not caught by "ass"
+                if (start == 0 or not lowered[start - 1].isalnum()) and \
+                        (i + 1 == len(lowered) or not lowered[i + 1].isalnum()):
+                    yield start, i + 1
+
+    def filter(self, text):
+        spans = list(self.matches(text))
+        if not spans:
+            return text
+        chars = list(text)
+        for start, end in spans:
+            chars[start:end] = "*" * (end - start)
+        return "".join(chars)
+
+
+def _load_words(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line for line in f if line.strip() and not line.startswith("#")]
+    except OSError:
+        return []
+
+
+class _FilterHolder:
     """
-    return text
+    Keeps the compiled filter and rebuilds it when the word list changes.
+
+    get() never touches the disk: at most every CHAT_FILTER_RELOAD_SECONDS
+    it starts a background thread that checks the file's mtime and, if it
+    changed, builds a new matcher and swaps it in. Readers keep using the
+    old one until then.
+    """
+
+    def __init__(self):
+        self.filter = None
+        self.mtime = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.reloading = False
+
+    def get(self):
+        chat_filter = self.filter
+        if chat_filter is None:
+            # Normally loaded by CoreConfig.ready(), before any consumer runs
+            return self.load()
+        now = time.monotonic()
+        if not self.reloading and now - self.checked_at >= settings.CHAT_FILTER_RELOAD_SECONDS:
+            self.checked_at = now
+            self.reloading = True
+            threading.Thread(target=self._reload, name="chat-filter-reload", daemon=True).start()
+        return chat_filter
+
+    def load(self):
+        """Build the matcher if the word list changed (or was never loaded)."""
+        path = settings.CHAT_FILTER_WORDLIST
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        with self.lock:
+            if self.filter is None or mtime != self.mtime:
+                # A single attribute store: readers see the old or the new filter
+                self.filter = ChatFilter(_load_words(path))
+                self.mtime = mtime
+            return self.filter
+
+    def _reload(self):
+        try:
+            self.load()
+        finally:
+            self.reloading = False
+
+
+_holder = _FilterHolder()
+
+
+def load_filter():
+    """Build the matcher now, so the first chat message doesn't pay for it."""
+    return _holder.load()
+
+
+def filter_chat(text: str) -> str:
+    """Mask banned words in ``text`` with ``*``."""
+    return _holder.get().filter(text)
+
+
+class RateLimiter:
+    """Token bucket: ``rate`` messages per ``per`` seconds, bursts up to ``rate``."""
+
+    def __init__(self, rate, per):
+        self.capacity = float(rate)
+        self.tokens = float(rate)
+        self.refill = rate / per
+        self.updated = time.monotonic()
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
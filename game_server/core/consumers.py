@@ -1,20 +1,54 @@
-import asyncio
+import hashlib
 import json
+import math
+import time
 import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
-import redis.asyncio as aioredis
+from channels.consumer import get_handler_name
+from django.conf import settings
 
-REDIS_URL = "redis://127.0.0.1:6379/0"
-redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+from .chat import RateLimiter, filter_chat
+from .history import append_chat, fetch_chat_history
+from .lagcomp import StateHistory, kick_plausible, rewind_time
+from .outbound import OutboundQueue
+from .profiling import profiler
+from .rooms import SPECTATORS_FIELD, room_manager
+from .store import get_store
+from .tasks import spawn
 
 WAITING_QUEUE_KEY = "waiting_players"
 
+# Secret the client keeps across sessions (app/connect.py); see _player_id()
+PLAYER_TOKEN_HEADER = b"x-player-token"
+
+# Open sockets on this worker, for admission control
+active_connections = 0
+
+ACTIONS = ("find_game", "leave_game", "update", "chat", "chat_history", "score", "spectate", "ping")
+
 def _game_state_key(game_id):
     return f"game:{game_id}:state"
 
 def _game_players_key(game_id):
     return f"game:{game_id}:players"
 
+def _spectator_group(game_id):
+    return f"spectate_{game_id}"
+
+def encode(data):
+    return json.dumps(data, separators=(",", ":"))
+
+def _point(data):
+    try:
+        x, y = float(data["x"]), float(data["y"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    # NaN would make every kick check against this point fail
+    return (x, y) if math.isfinite(x) and math.isfinite(y) else None
+
+def _without_ball(payload):
+    return {key: value for key, value in payload.items() if key not in ("ball", "kick")}
+
 # Physics constants
 GRAVITY = 0.6
 GROUND_Y = 420 - 40
@@ -23,29 +57,112 @@ HEIGHT = 420
 FRICTION = 0.995
 BALL_RADIUS = 15
 
+def _player_id(scope):
+    """
+    Stable public id of the player behind a socket, or None for a client
+    that sent no token. Ratings and results are keyed on it. It is a hash
+    of the token, so the ids listed on the leaderboard can't be replayed
+    to play as someone else.
+    """
+    for name, value in scope.get("headers", ()):
+        if name == PLAYER_TOKEN_HEADER and 16 <= len(value) <= 128:
+            return hashlib.sha256(value).hexdigest()[:24]
+    return None
+
+def send_interval_hint():
+    """
+    How often clients should send updates. Busy workers ask for a slower
+    rate so the load they shed scales with the number of connections.
+    """
+    if active_connections >= settings.WS_MAX_CONNECTIONS * settings.CLIENT_BUSY_LOAD:
+        return settings.CLIENT_SEND_INTERVAL_BUSY
+    return settings.CLIENT_SEND_INTERVAL
+
 class GameConsumer(AsyncWebsocketConsumer):
+    admitted = False
+    outbound = None
+    room = None
+
     async def connect(self):
-        self.client_id = str(uuid.uuid4())
-        self.game_id = None
-        self.role = None
+        global active_connections
         await self.accept()
+        if active_connections >= settings.WS_MAX_CONNECTIONS:
+            # Tell the client why before closing; 1013 is "try again later"
+            await self.send(text_data=json.dumps({"type": "server_full"}))
+            await self.close(code=1013)
+            return
+        active_connections += 1
+        self.admitted = True
+
+        self.setup_connection(get_store(), OutboundQueue(
+            self.send,
+            max_frames=settings.WS_OUTBOUND_MAX_FRAMES,
+            stall_seconds=settings.WS_SEND_STALL_SECONDS,
+        ), player_id=_player_id(self.scope))
+        self.outbound.start()
         await self.channel_layer.group_add(f"player_{self.client_id}", self.channel_name)
-        await self.send_json({"type": "connected", "client_id": self.client_id})
+        await self.send_json({
+            "type": "connected",
+            "client_id": self.client_id,
+            "player_id": self.player_id,
+            "send_interval": send_interval_hint(),
+        })
+
+    def setup_connection(self, store, outbound, player_id=None):
+        """
+        Per-connection state. Split out of connect() so the benchmarks build
+        consumers exactly the way a real connection does.
+        """
+        self.store = store
+        self.outbound = outbound
+        self.client_id = str(uuid.uuid4())  # this socket
+        self.player_id = player_id  # the person, across sockets
+        self.game_id = None
+        self.role = None
+        self.spectating = None
+        self.rtt = None  # as last reported by the client
+        self.history = StateHistory(settings.LAGCOMP_HISTORY_SIZE)
+        self.opponent_kick_at = 0.0
+        self.chat_limiter = RateLimiter(settings.CHAT_RATE_LIMIT, settings.CHAT_RATE_PERIOD)
 
     async def disconnect(self, code):
+        global active_connections
+        if not self.admitted:
+            return
+        self.admitted = False
+        active_connections -= 1
+        if self.spectating:
+            await self.channel_layer.group_discard(_spectator_group(self.spectating), self.channel_name)
+            await self.count_spectator(self.spectating, -1)
         if self.game_id:
-            await redis.hset(_game_state_key(self.game_id), f"player:{self.client_id}:connected", "0")
-            await self.channel_layer.group_send(
-                self.game_group_name,
-                {"type": "player.left", "client_id": self.client_id}
-            )
-        queue_players = await redis.lrange(WAITING_QUEUE_KEY, 0, -1)
-        if self.client_id in queue_players:
-            await redis.lrem(WAITING_QUEUE_KEY, 0, self.client_id)
+            await self.leave_game()
+        await self.store.queue_remove(WAITING_QUEUE_KEY, self.client_id)
+        if self.outbound is not None:
+            await self.outbound.stop()
+
+    async def dispatch(self, message):
+        # Channel layer events and websocket frames both come through here.
+        # Unlike AsyncConsumer.dispatch this skips close_old_connections(),
+        # a thread pool hop per message: the consumer never uses the ORM on
+        # the event loop (results are saved by core.results' writer thread).
+        handler = getattr(self, get_handler_name(message), None)
+        if handler is None:
+            raise ValueError("No handler for message type %s" % message["type"])
+        if profiler.enabled:
+            return await profiler.run(f"event:{message['type']}", handler(message))
+        return await handler(message)
 
     async def receive(self, text_data=None, bytes_data=None):
+        if text_data is None or len(text_data) > settings.WS_MAX_FRAME_LENGTH:
+            return
         data = json.loads(text_data)
         action = data.get("action")
+        if profiler.enabled:
+            name = action if action in ACTIONS else "unknown"
+            return await profiler.run(f"action:{name}", self.handle_action(action, data))
+        return await self.handle_action(action, data)
+
+    async def handle_action(self, action, data):
         if action == "find_game":
             await self.find_match()
         elif action == "leave_game":
@@ -54,18 +171,30 @@ class GameConsumer(AsyncWebsocketConsumer):
             await self.handle_update(data.get("payload", {}))
         elif action == "chat":
             await self.handle_chat(data.get("payload", {}))
+        elif action == "chat_history":
+            await self.handle_chat_history(data.get("payload", {}))
         elif action == "score":
             await self.handle_score(data.get("payload", {}))
+        elif action == "spectate":
+            await self.spectate(data.get("payload", {}))
+        elif action == "ping":
+            payload = data.get("payload", {})
+            if payload.get("rtt") is not None:
+                self.rtt = payload["rtt"]
+            await self.send_json({
+                "type": "pong",
+                "t": payload.get("t"),
+                "send_interval": send_interval_hint(),
+            })
 
     # Matchmaking
     async def find_match(self):
-        await redis.rpush(WAITING_QUEUE_KEY, self.client_id)
-        queue_len = await redis.llen(WAITING_QUEUE_KEY)
+        queue_len = await self.store.queue_push(WAITING_QUEUE_KEY, self.client_id)
         if queue_len >= 2:
-            p1 = await redis.lpop(WAITING_QUEUE_KEY)
-            p2 = await redis.lpop(WAITING_QUEUE_KEY)
+            p1 = await self.store.queue_pop(WAITING_QUEUE_KEY)
+            p2 = await self.store.queue_pop(WAITING_QUEUE_KEY)
             if self.client_id not in (p1, p2):
-                await redis.lpush(WAITING_QUEUE_KEY, p2, p1)
+                await self.store.queue_push_front(WAITING_QUEUE_KEY, p2, p1)
                 await self.send_json({"type": "searching"})
                 return
 
@@ -81,6 +210,7 @@ class GameConsumer(AsyncWebsocketConsumer):
                 "ball_vy": str(-4),
                 "score_left": "0",
                 "score_right": "0",
+                "started_at": str(time.time()),
                 f"player:{self.client_id}:role": role_map[self.client_id],
                 f"player:{self.client_id}:connected": "1",
                 f"player:{other}:role": role_map[other],
@@ -90,14 +220,15 @@ class GameConsumer(AsyncWebsocketConsumer):
                 f"player:{p1}:y": str(GROUND_Y),
                 f"player:{p2}:y": str(GROUND_Y)
             }
-            await redis.hset(_game_state_key(game_id), mapping=initial_state)
-            await redis.sadd(_game_players_key(game_id), self.client_id, other)
+            await self.store.create_game(
+                _game_state_key(game_id), initial_state,
+                _game_players_key(game_id), [self.client_id, other],
+                settings.GAME_TTL_SECONDS,
+            )
 
             # Setup consumer state
-            self.game_id = game_id
             self.role = role_map[self.client_id]
-            self.game_group_name = f"game_{game_id}"
-            await self.channel_layer.group_add(self.game_group_name, self.channel_name)
+            await self.join_room(game_id)
 
             # Notify both players via their private groups
             for player_id in [self.client_id, other]:
@@ -118,10 +249,19 @@ class GameConsumer(AsyncWebsocketConsumer):
         if not self.game_id:
             return
 
-        state_key = _game_state_key(self.game_id)
         mapping = {}
         player_id = payload.get("player_id", self.client_id)
 
+        # Lag compensation: a kick is checked against the ball this client
+        # was seeing, one RTT back. A refused kick, or a ball sent before
+        # this client could have seen the opponent's kick, is not forwarded.
+        now = time.monotonic()
+        if payload.get("kick"):
+            if not self.kick_allowed(payload, now):
+                payload = _without_ball(payload)
+        elif "ball" in payload and self.opponent_kick_at > self.rewind_to(now):
+            payload = _without_ball(payload)
+
         pos = payload.get("pos")
         if pos:
             mapping[f"player:{player_id}:x"] = str(pos.get("x", 0))
@@ -138,18 +278,37 @@ class GameConsumer(AsyncWebsocketConsumer):
             mapping["ball_vy"] = str(ball.get("vy", 0))
 
         if mapping:
-            await redis.hset(state_key, mapping=mapping)
+            # Written to the store by the room's next tick
+            self.room.record(mapping)
 
-        # Broadcast to both players (including sender for confirmation)
+        # Broadcast to both players (including sender for confirmation).
+        # The client frame is encoded once here and forwarded as-is by every
+        # recipient instead of each one re-serializing the payload.
+        frame = encode({"type": "update", "payload": payload, "from": player_id})
         await self.channel_layer.group_send(
             f"game_{self.game_id}",
             {
                 "type": "game.update",
-                "payload": payload,
                 "from": player_id,
+                "frame": frame,
+                # For the recipients' lag compensation history
+                "ball": _point(payload["ball"]) if "ball" in payload else None,
+                "kick": bool(payload.get("kick")),
             }
         )
 
+        # Spectators get this player's stream downsampled by the room's tick
+        self.room.set_spectator_frame(player_id, frame)
+
+    def rewind_to(self, now):
+        return rewind_time(now, self.rtt, settings.LAGCOMP_MAX_REWIND)
+
+    def kick_allowed(self, payload, now):
+        player_pos = _point(payload.get("pos"))
+        if player_pos is None:
+            return False
+        return kick_plausible(self.history, self.rewind_to(now), player_pos, settings.LAGCOMP_REACH)
+
     # Score updates
     async def handle_score(self, payload):
         if not self.game_id:
@@ -163,46 +322,93 @@ class GameConsumer(AsyncWebsocketConsumer):
             mapping["score_right"] = str(payload["right"])
         
         if mapping:
-            await redis.hset(state_key, mapping=mapping)
+            await self.store.hset(state_key, mapping)
         
         # Broadcast score update to both players
-        await self.channel_layer.group_send(
-            f"game_{self.game_id}",
-            {
-                "type": "score.update",
-                "payload": payload,
-                "from": self.client_id,
-            }
-        )
+        event = {
+            "type": "score.update",
+            "from": self.client_id,
+            "frame": encode({"type": "score_update", "payload": payload, "from": self.client_id}),
+        }
+        await self.channel_layer.group_send(f"game_{self.game_id}", event)
+        self.send_to_spectators(event)
 
     # Chat
     async def handle_chat(self, payload):
         if not self.game_id:
             return
-        message = payload.get("message", "")
+        message = str(payload.get("message", ""))
         player_id = payload.get("player_id", self.client_id)
-        
+        if len(message) > settings.CHAT_MAX_LENGTH:
+            await self.send_json({"type": "chat_rejected", "reason": "too_long"})
+            return
+        if not self.chat_limiter.allow():
+            await self.send_json({"type": "chat_rejected", "reason": "rate_limited"})
+            return
+        message = filter_chat(message)
+        await append_chat(self.store, self.game_id, player_id, message)
+
         # Broadcast to both players in the game
+        payload = {"player_id": player_id, "message": message}
         await self.channel_layer.group_send(
             self.game_group_name,
             {
                 "type": "chat.message",
-                "payload": {"player_id": player_id, "message": message}
+                "frame": encode({"type": "chat", "payload": payload}),
             }
         )
 
+    async def handle_chat_history(self, payload):
+        game_id = self.game_id or self.spectating
+        if not game_id:
+            return
+        messages, next_cursor = await fetch_chat_history(
+            self.store, game_id,
+            before=payload.get("before"),
+            count=payload.get("count", 20),
+        )
+        await self.send_json({"type": "chat_history", "messages": messages, "next": next_cursor})
+
     async def chat_message(self, event):
-        await self.send_json({"type": "chat", "payload": event["payload"]})
+        await self.send_event(event, lambda: {"type": "chat", "payload": event["payload"]})
+
+    # Rooms
+    async def join_room(self, game_id):
+        if game_id == self.game_id:
+            # The match maker also gets its own "matched" event
+            return
+        if self.game_id:
+            await self.leave_room()
+        self.game_id = game_id
+        self.game_group_name = f"game_{game_id}"
+        self.room = room_manager.join(game_id, self)
+        await self.channel_layer.group_add(self.game_group_name, self.channel_name)
+
+    async def leave_room(self):
+        room_manager.leave(self.room, self)
+        await self.channel_layer.group_discard(self.game_group_name, self.channel_name)
+        self.game_id = self.room = None
 
     # Leave / matched / player_left
     async def leave_game(self):
         if not self.game_id:
             return
-        await redis.hset(_game_state_key(self.game_id), f"player:{self.client_id}:connected", "0")
-        await self.channel_layer.group_send(
-            self.game_group_name,
-            {"type": "player.left", "client_id": self.client_id}
-        )
+        await self.store.hset(_game_state_key(self.game_id), {f"player:{self.client_id}:connected": "0"})
+        await self.finish_match()
+        await self.announce_left()
+        await self.leave_room()
+
+    async def announce_left(self):
+        event = {
+            "type": "player.left",
+            "client_id": self.client_id,
+            "frame": encode({"type": "player_left", "client_id": self.client_id}),
+        }
+        await self.channel_layer.group_send(self.game_group_name, event)
+        self.send_to_spectators(event)
+
+    async def finish_match(self):
+        await self.room.finish()
 
     async def matched(self, event):
         await self.send_json({
@@ -211,18 +417,95 @@ class GameConsumer(AsyncWebsocketConsumer):
             "role": event["role"],
             "state": event["state"]
         })
-        self.game_id = event["game_id"]
-        self.game_group_name = f"game_{self.game_id}"
-        await self.channel_layer.group_add(self.game_group_name, self.channel_name)
+        if self.player_id:
+            # Lets the result be recorded against the player, not the socket
+            await self.store.hset(_game_state_key(event["game_id"]), {
+                f"player:{self.client_id}:player_id": self.player_id,
+            })
+        await self.join_room(event["game_id"])
+
+    # Spectators
+    async def spectate(self, payload):
+        game_id = payload.get("game_id")
+        if self.game_id or self.spectating or not isinstance(game_id, str):
+            return
+        state = await self.store.hgetall(_game_state_key(game_id))
+        if not state:
+            await self.send_json({"type": "spectate_failed", "game_id": game_id})
+            return
+        self.spectating = game_id
+        await self.channel_layer.group_add(_spectator_group(game_id), self.channel_name)
+        await self.count_spectator(game_id, 1)
+        # Keyframe with the full current state, then downsampled updates
+        await self.send_json({"type": "keyframe", "game_id": game_id, "state": state})
+
+    async def count_spectator(self, game_id, amount):
+        # Rooms skip spectator sends while a game has none (see core/rooms.py)
+        key = _game_state_key(game_id)
+        count = await self.store.hincrby(key, SPECTATORS_FIELD, amount)
+        if count <= 0:
+            # The hash may have expired and been recreated by this call
+            await self.store.expire(key, settings.GAME_TTL_SECONDS)
+        room_manager.set_spectators(game_id, count)
+
+    def send_to_spectators(self, event):
+        """
+        Fire-and-forget send to the game's spectator group, so players never
+        wait on spectator fan-out. Position updates go through the room's
+        tick instead (see core/rooms.py).
+        """
+        if not self.game_id or not self.room or self.room.spectators <= 0:
+            return
+        spawn(self.channel_layer.group_send(_spectator_group(self.game_id), event))
+
+    async def spectator_update(self, event):
+        await self.forward_update(event)
 
     async def player_left(self, event):
-        await self.send_json({"type": "player_left", "client_id": event["client_id"]})
+        await self.send_event(event, lambda: {"type": "player_left", "client_id": event["client_id"]})
 
     async def game_update(self, event):
-        await self.send_json({"type": "update", "payload": event["payload"], "from": event.get("from")})
+        sender = event.get("from")
+        now = time.monotonic()
+        if event.get("ball") is not None:
+            self.history.record(now, event["ball"])
+        if event.get("kick") and sender != self.client_id:
+            self.opponent_kick_at = now
+        await self.forward_update(event)
+
+    async def forward_update(self, event):
+        # Snapshots from the same sender replace each other while queued
+        await self.send_event(
+            event,
+            lambda: {"type": "update", "payload": event["payload"], "from": event.get("from")},
+            coalesce_key=event.get("from"),
+        )
 
     async def score_update(self, event):
-        await self.send_json({"type": "score_update", "payload": event["payload"], "from": event.get("from")})
+        await self.send_event(
+            event, lambda: {"type": "score_update", "payload": event["payload"], "from": event.get("from")}
+        )
+
+    async def send_event(self, event, build, coalesce_key=None):
+        """
+        Forward a group event to the client. Events may carry the client
+        frame pre-encoded in ``frame`` (str for a text frame, bytes for a
+        binary one); otherwise ``build()`` gives the message to encode here.
+        """
+        frame = event.get("frame")
+        await self.send_frame(encode(build()) if frame is None else frame, coalesce_key)
+
+    async def send_json(self, data, coalesce_key=None):
+        await self.send_frame(encode(data), coalesce_key)
+
+    async def send_frame(self, frame, coalesce_key=None):
+        if self.outbound is None:
+            return
+        if not self.outbound.put(frame, coalesce_key):
+            await self.drop_slow_consumer()
 
-    async def send_json(self, data):
-        await self.send(text_data=json.dumps(data))
\ No newline at end of file
+    async def drop_slow_consumer(self):
+        # The client stopped reading: stop buffering for it and hang up
+        outbound, self.outbound = self.outbound, None
+        await outbound.stop()
+        await self.close(code=1008)
\ No newline at end of file
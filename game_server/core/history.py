@@ -0,0 +1,50 @@
+# history.py
+import re
+import time
+
+from django.conf import settings
+
+_STREAM_ID = re.compile(r"^\d+-\d+$")
+
+
+def _chat_stream_key(game_id):
+    return f"game:{game_id}:chat"
+
+
+async def append_chat(store, game_id, player_id, message):
+    """
+    Store a chat line in the game's capped stream. The stream is trimmed to
+    CHAT_HISTORY_MAXLEN and expires with the rest of the game.
+    """
+    return await store.stream_append(
+        _chat_stream_key(game_id),
+        {"player_id": player_id, "message": message, "ts": str(time.time())},
+        maxlen=settings.CHAT_HISTORY_MAXLEN,
+        ttl=settings.GAME_TTL_SECONDS,
+    )
+
+
+async def fetch_chat_history(store, game_id, before=None, count=20):
+    """
+    One page of chat, newest page first, messages oldest-first within it.
+    Pass the returned ``next`` cursor as ``before`` to get the page older
+    than this one; ``next`` is None once the start of the stream is reached.
+    """
+    try:
+        count = max(1, min(int(count), settings.CHAT_HISTORY_PAGE_MAX))
+    except (TypeError, ValueError):
+        count = settings.CHAT_HISTORY_PAGE_MAX
+    if not isinstance(before, str) or not _STREAM_ID.match(before):
+        before = None
+    entries = await store.stream_range(_chat_stream_key(game_id), before=before, count=count)
+    messages = [
+        {
+            "id": entry_id,
+            "player_id": fields.get("player_id", ""),
+            "message": fields.get("message", ""),
+            "ts": float(fields.get("ts", 0)),
+        }
+        for entry_id, fields in reversed(entries)
+    ]
+    next_cursor = messages[0]["id"] if len(messages) == count else None
+    return messages, next_cursor
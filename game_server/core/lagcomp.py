@@ -0,0 +1,96 @@
+# lagcomp.py
+"""
+Lag compensation for kick claims.
+
+A client draws the ball where the last update put it, roughly one round trip
+behind the server. So when it reports a kick, the claim is checked against
+where the ball was one RTT ago, not where it is now. Each consumer keeps a
+StateHistory of the ball positions its game's players reported, stamped
+with the time they reached the server. It rewinds to ``now - rtt`` (capped at
+LAGCOMP_MAX_REWIND) to see whether the claimed kick was possible.
+"""
+import math
+
+# Player sprite size (app/assets/player_*.png); the client adds 10px above
+# the head to the hitbox it tests the ball against
+PLAYER_WIDTH = 42
+PLAYER_HEIGHT = 95
+HITBOX_HEADROOM = 10
+
+
+class StateHistory:
+    """
+    Fixed-size ring buffer of reported ball positions: each sample is the
+    arrival time and the ball centre. Once the buffer is full, the oldest
+    sample is overwritten.
+
+    Player positions aren't kept: the only one a kick check needs is the
+    kicker's at the moment of the kick, which the claim itself carries.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.times = [0.0] * size
+        self.balls = [None] * size
+        self.head = 0  # slot the next sample goes in
+        self.count = 0
+
+    def record(self, t, ball):
+        i = self.head
+        self.times[i] = t
+        self.balls[i] = ball
+        self.head = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _samples(self):
+        """Slot indexes, oldest first."""
+        start = (self.head - self.count) % self.size
+        return [(start + n) % self.size for n in range(self.count)]
+
+    def ball_at(self, t):
+        """Ball centre at time ``t``, interpolated between samples, or None."""
+        before = after = None
+        for i in self._samples():
+            if self.times[i] <= t:
+                before = i
+            else:
+                after = i
+                break
+        if before is None:
+            # Older than anything kept: the oldest sample is the best guess
+            return None if after is None else self.balls[after]
+        if after is None:
+            return self.balls[before]
+        t0, t1 = self.times[before], self.times[after]
+        k = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+        (x0, y0), (x1, y1) = self.balls[before], self.balls[after]
+        return (x0 + (x1 - x0) * k, y0 + (y1 - y0) * k)
+
+
+def rewind_time(now, rtt, max_rewind):
+    """The server time a client with round trip ``rtt`` was looking at."""
+    try:
+        rtt = float(rtt)
+    except (TypeError, ValueError):
+        rtt = max_rewind
+    if not math.isfinite(rtt):
+        # json.loads accepts NaN and Infinity; NaN would defeat both checks
+        rtt = max_rewind
+    return now - min(max(rtt, 0.0), max_rewind)
+
+
+def kick_plausible(history, t, player_pos, reach):
+    """
+    Whether a player standing at ``player_pos`` (rect top-left) could have
+    touched the ball as it was at time ``t``. ``reach`` is how far outside the
+    hitbox the ball centre may be (ball radius plus slack for the time
+    between samples). With no ball history to go on, the claim is allowed.
+    """
+    ball = history.ball_at(t)
+    if ball is None:
+        return True
+    bx, by = ball
+    x, y = player_pos
+    dx = max(x - bx, 0.0, bx - (x + PLAYER_WIDTH))
+    dy = max(y - HITBOX_HEADROOM - by, 0.0, by - (y + PLAYER_HEIGHT))
+    return dx * dx + dy * dy <= reach * reach
@@ -0,0 +1,163 @@
+# leaderboard.py
+import hashlib
+import json
+import threading
+import time
+
+import redis as redis_sync
+from django.conf import settings
+
+LEADERBOARD_KEY = "leaderboard:rating"
+
+DEFAULT_RATING = 1000.0
+K_FACTOR = 32.0
+
+_client = None
+
+
+def get_client():
+    """Blocking Redis client for views and the result writer thread."""
+    global _client
+    if _client is None:
+        _client = redis_sync.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def _elo(rating_a, rating_b, score_a):
+    expected_a = 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+    delta = K_FACTOR * (score_a - expected_a)
+    # Rounded at every step so a rebuild reproduces the live ratings exactly
+    return round(rating_a + delta, 2), round(rating_b - delta, 2)
+
+
+def _match_score(result):
+    """
+    (player_a, player_b, score of a) for a two player result, else None.
+    Only matches between two players with stable ids are rated: a client
+    id lasts one connection, so rating it would add a sorted set member
+    per player per match that nobody can ever look up again.
+    """
+    players = result["players"]
+    if len(players) != 2 or not all(player["ranked"] for player in players):
+        return None
+    a, b = players
+    if a["player_id"] == b["player_id"]:
+        return None  # two windows on one machine share the token
+    score_a = {"win": 1.0, "draw": 0.5, "loss": 0.0}[a["result"]]
+    return a["player_id"], b["player_id"], score_a
+
+
+def apply_results(results, client=None):
+    """
+    Update ratings for newly finished matches. Each match is a WATCH/MULTI
+    transaction over the sorted set, so results coming from several workers
+    don't overwrite each other.
+    """
+    client = client or get_client()
+    for result in results:
+        match = _match_score(result)
+        if match is None:
+            continue
+        a, b, score_a = match
+
+        def update(pipe):
+            rating_a = pipe.zscore(LEADERBOARD_KEY, a)
+            rating_b = pipe.zscore(LEADERBOARD_KEY, b)
+            new_a, new_b = _elo(
+                DEFAULT_RATING if rating_a is None else rating_a,
+                DEFAULT_RATING if rating_b is None else rating_b,
+                score_a,
+            )
+            pipe.multi()
+            pipe.zadd(LEADERBOARD_KEY, {a: new_a, b: new_b})
+
+        client.transaction(update, LEADERBOARD_KEY)
+
+
+def rebuild_from_db(client=None):
+    """
+    Recompute every rating by replaying stored matches in order, then swap
+    the new sorted set in with a single RENAME.
+    """
+    from .models import MatchResult
+
+    client = client or get_client()
+    ratings = {}
+    matches = MatchResult.objects.order_by("ended_at", "id").prefetch_related("players")
+    for match in matches.iterator(chunk_size=2000):
+        result = {"players": [
+            {"player_id": p.player_id, "ranked": p.ranked, "result": p.result}
+            for p in sorted(match.players.all(), key=lambda p: p.role)
+        ]}
+        scored = _match_score(result)
+        if scored is None:
+            continue
+        a, b, score_a = scored
+        ratings[a], ratings[b] = _elo(
+            ratings.get(a, DEFAULT_RATING), ratings.get(b, DEFAULT_RATING), score_a
+        )
+
+    tmp_key = f"{LEADERBOARD_KEY}:rebuild"
+    pipe = client.pipeline(transaction=False)
+    pipe.delete(tmp_key)
+    items = list(ratings.items())
+    for i in range(0, len(items), 1000):
+        pipe.zadd(tmp_key, dict(items[i:i + 1000]))
+    if items:
+        pipe.rename(tmp_key, LEADERBOARD_KEY)
+    else:
+        pipe.delete(LEADERBOARD_KEY)
+    pipe.execute()
+    return len(items)
+
+
+def _rows(entries, first_rank):
+    return [
+        {"rank": first_rank + i, "player_id": player, "rating": rating}
+        for i, (player, rating) in enumerate(entries)
+    ]
+
+
+def top(limit=10, offset=0, client=None):
+    client = client or get_client()
+    entries = client.zrevrange(LEADERBOARD_KEY, offset, offset + limit - 1, withscores=True)
+    return {"total": client.zcard(LEADERBOARD_KEY), "entries": _rows(entries, offset + 1)}
+
+
+def around(player_id, radius=5, client=None):
+    """The player's rank plus ``radius`` neighbours either side, or None."""
+    client = client or get_client()
+    rank = client.zrevrank(LEADERBOARD_KEY, player_id)
+    if rank is None:
+        return None
+    start = max(0, rank - radius)
+    entries = client.zrevrange(LEADERBOARD_KEY, start, rank + radius, withscores=True)
+    return {"rank": rank + 1, "player_id": player_id, "entries": _rows(entries, start + 1)}
+
+
+class TTLCache:
+    """Tiny in-process cache of rendered responses: key -> (body, etag)."""
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key, data):
+        body = json.dumps(data, separators=(",", ":"))
+        value = (body, '"%s"' % hashlib.md5(body.encode()).hexdigest())
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                now = time.monotonic()
+                self.entries = {k: v for k, v in self.entries.items() if v[0] >= now}
+                if len(self.entries) >= self.max_entries:
+                    self.entries.clear()
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+        return value
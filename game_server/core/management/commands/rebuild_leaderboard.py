@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.leaderboard import rebuild_from_db
+
+
+class Command(BaseCommand):
+    help = "Recompute the Redis leaderboard from stored match results."
+
+    def handle(self, *args, **options):
+        count = rebuild_from_db()
+        self.stdout.write(self.style.SUCCESS(f"Leaderboard rebuilt with {count} players"))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_id', models.UUIDField(unique=True)),
+                ('score_left', models.PositiveIntegerField(default=0)),
+                ('score_right', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['-ended_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlayerMatchStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('player_id', models.CharField(db_index=True, max_length=64)),
+                ('role', models.CharField(choices=[('left', 'Left'), ('right', 'Right')], max_length=5)),
+                ('goals', models.PositiveIntegerField(default=0)),
+                ('conceded', models.PositiveIntegerField(default=0)),
+                ('result', models.CharField(choices=[('win', 'Win'), ('loss', 'Loss'), ('draw', 'Draw')], max_length=4)),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='players', to='core.matchresult')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('match', 'player_id'), name='unique_player_per_match')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playermatchstats',
+            name='ranked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
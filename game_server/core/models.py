@@ -1,3 +1,36 @@
 from django.db import models
 
-# Create your models here.
+
+class MatchResult(models.Model):
+    game_id = models.UUIDField(unique=True)
+    score_left = models.PositiveIntegerField(default=0)
+    score_right = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["-ended_at"]
+
+    def __str__(self):
+        return f"{self.game_id} {self.score_left}-{self.score_right}"
+
+
+class PlayerMatchStats(models.Model):
+    ROLE_CHOICES = [("left", "Left"), ("right", "Right")]
+    RESULT_CHOICES = [("win", "Win"), ("loss", "Loss"), ("draw", "Draw")]
+
+    match = models.ForeignKey(MatchResult, related_name="players", on_delete=models.CASCADE)
+    player_id = models.CharField(max_length=64, db_index=True)
+    ranked = models.BooleanField(default=False)  # a stable player id, not a one-off socket
+    role = models.CharField(max_length=5, choices=ROLE_CHOICES)
+    goals = models.PositiveIntegerField(default=0)
+    conceded = models.PositiveIntegerField(default=0)
+    result = models.CharField(max_length=4, choices=RESULT_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["match", "player_id"], name="unique_player_per_match"),
+        ]
+
+    def __str__(self):
+        return f"{self.player_id} ({self.role}) {self.result}"
@@ -0,0 +1,91 @@
+# outbound.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundQueue:
+    """
+    Per-connection send queue drained by a single writer task.
+
+    Frames put with a ``coalesce_key`` (game snapshots) replace any frame
+    with the same key that is still waiting, so a client that reads slowly
+    only ever gets the latest snapshot instead of a growing backlog. Other
+    frames (chat, scores, ...) are kept in order; if more than ``max_frames``
+    pile up, or one send has been stuck for ``stall_seconds``, ``put``
+    returns False and the consumer drops the connection. It also returns
+    False once a send has failed (the socket is gone): the writer logs the
+    error and stops.
+
+    The limits only work if ``send`` waits while the client isn't reading,
+    as it does under uvicorn's websockets implementations. Daphne's send
+    returns as soon as the frame is buffered, so the queue never backs up.
+    """
+
+    def __init__(self, send, max_frames=64, stall_seconds=5.0):
+        self.send = send
+        self.max_frames = max_frames
+        self.stall_seconds = stall_seconds
+        self.frames = OrderedDict()
+        self.sending_since = None
+        self.dropped = 0
+        self.failed = False
+        self._seq = 0
+        self._ready = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                logger.exception("outbound writer failed")
+            self._task = None
+
+    def put(self, frame, coalesce_key=None):
+        """Queue a text (str) or binary (bytes) frame."""
+        if self.failed:
+            return False
+        if self.sending_since is not None and time.monotonic() - self.sending_since > self.stall_seconds:
+            return False
+        if coalesce_key is not None:
+            key = ("latest", coalesce_key)
+            if key in self.frames:
+                self.dropped += 1
+        else:
+            self._seq += 1
+            key = self._seq
+        self.frames[key] = frame
+        if len(self.frames) > self.max_frames:
+            return False
+        self._ready.set()
+        return True
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            while self.frames:
+                _, frame = self.frames.popitem(last=False)
+                self.sending_since = time.monotonic()
+                try:
+                    if isinstance(frame, bytes):
+                        await self.send(bytes_data=frame)
+                    else:
+                        await self.send(text_data=frame)
+                except Exception as e:
+                    # Typically a send on a socket the client already closed
+                    logger.info("outbound send failed, dropping %d queued frames: %r", len(self.frames), e)
+                    self.failed = True
+                    self.frames.clear()
+                    return
+                self.sending_since = None
+            self._ready.clear()
@@ -0,0 +1,170 @@
+# profiling.py
+import asyncio
+import bisect
+import logging
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds (last bucket is +inf)
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+MAX_SLOW_CALLS = 100
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.calls = 0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+        self.calls += 1
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p):
+        """Approximate percentile: upper bound of the bucket holding it."""
+        if not self.calls:
+            return 0.0
+        target = self.calls * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip([str(b) for b in BUCKETS_MS] + ["inf"], self.counts)),
+        }
+
+
+def _await_chain(task):
+    """Stack of a suspended task, following the chain of awaited coroutines."""
+    frames = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            frames.append(f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+class Profiler:
+    """
+    Opt-in timing of consumer actions and event handlers.
+    Everything is a no-op while ``enabled`` is False, so the consumer only
+    pays for one attribute lookup per message.
+    """
+
+    def __init__(self, enabled=False, slow_ms=50.0):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.histograms = {}
+        self.slow_calls = []
+        self._lock = threading.RLock()
+
+    def enable(self):
+        self.enabled = True
+        logger.info("profiling enabled (slow threshold %.1f ms)", self.slow_ms)
+
+    def disable(self):
+        self.enabled = False
+        logger.info("profiling disabled")
+
+    def toggle(self):
+        self.disable() if self.enabled else self.enable()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.slow_calls = []
+
+    def record(self, name, ms, stack=None):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(ms)
+            if ms >= self.slow_ms:
+                self.slow_calls.append({"name": name, "ms": round(ms, 3), "stack": stack or []})
+                del self.slow_calls[:-MAX_SLOW_CALLS]
+        if ms >= self.slow_ms:
+            logger.warning("slow call %s took %.1f ms\n  %s", name, ms, "\n  ".join(stack or ["<no sample>"]))
+
+    async def run(self, name, coro):
+        """Await ``coro`` and record its duration under ``name``."""
+        task = asyncio.current_task()
+        samples = []
+
+        def sample():
+            # Fires only if the call is still running past the slow threshold:
+            # shows what it is waiting on (Redis, channel layer, ...)
+            samples.extend(_await_chain(task))
+
+        handle = asyncio.get_running_loop().call_later(self.slow_ms / 1000, sample)
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            handle.cancel()
+            self.record(name, (time.perf_counter() - start) * 1000, samples)
+
+    def report(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "actions": {name: hist.summary() for name, hist in sorted(self.histograms.items())},
+                "slow_calls": list(self.slow_calls),
+            }
+
+    def log_report(self):
+        report = self.report()
+        for name, summary in report["actions"].items():
+            logger.info(
+                "%-24s calls=%d mean=%.3fms p50<=%sms p99<=%sms max=%.3fms",
+                name, summary["calls"], summary["mean_ms"], summary["p50_ms"],
+                summary["p99_ms"], summary["max_ms"],
+            )
+        logger.info("%d slow calls recorded", len(report["slow_calls"]))
+
+
+profiler = Profiler()
+
+# Other reports logged along with the profiler's on SIGUSR2
+reporters = []
+
+
+def configure(enabled, slow_ms):
+    profiler.enabled = enabled
+    profiler.slow_ms = slow_ms
+
+
+def install_signal_handlers():
+    """
+    SIGUSR1 toggles profiling, SIGUSR2 logs the current report and any
+    registered ``reporters``. Lets us flip profiling on a running worker
+    without a restart.
+    """
+    if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return
+    signal.signal(signal.SIGUSR1, lambda *_: profiler.toggle())
+    signal.signal(signal.SIGUSR2, lambda *_: _log_reports())
+
+
+def _log_reports():
+    profiler.log_report()
+    for report in reporters:
+        report()
@@ -0,0 +1,200 @@
+# results.py
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _score(value):
+    # Scores are reported by clients, so don't trust them to be numbers
+    try:
+        return max(0, int(float(value)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def result_from_state(game_id, state, ended_at=None):
+    """Build a result record from a game's Redis state hash."""
+    score_left = _score(state.get("score_left", 0))
+    score_right = _score(state.get("score_right", 0))
+    started = state.get("started_at")
+    players = []
+    for key, role in state.items():
+        if key.startswith("player:") and key.endswith(":role"):
+            client_id = key[len("player:"):-len(":role")]
+            # Players whose client sent a token are recorded under their
+            # stable id and rated; others under the socket's client id
+            player_id = state.get(f"player:{client_id}:player_id")
+            goals, conceded = (score_left, score_right) if role == "left" else (score_right, score_left)
+            result = "win" if goals > conceded else "loss" if goals < conceded else "draw"
+            players.append({
+                "player_id": player_id or client_id,
+                "ranked": player_id is not None,
+                "role": role,
+                "goals": goals,
+                "conceded": conceded,
+                "result": result,
+            })
+    return {
+        "game_id": game_id,
+        "score_left": score_left,
+        "score_right": score_right,
+        "started_at": datetime.fromtimestamp(float(started), tz=timezone.utc) if started else None,
+        "ended_at": ended_at or datetime.now(tz=timezone.utc),
+        "players": players,
+    }
+
+
+class ResultWriter:
+    """
+    Buffers finished matches and bulk-inserts them from a background thread.
+    ``submit`` never touches the database, so the websocket event loop
+    only pays for a queue put.
+
+    A write that fails with OperationalError (typically SQLite's "database
+    is locked") is retried up to ``attempts`` times, waiting ``retry_delay``
+    seconds, doubled each time, in between. A batch with a duplicate match
+    is written one result at a time so only the duplicate is skipped.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, attempts=None, retry_delay=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue()
+        self.listeners = []  # called from the writer thread with each written batch
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, result):
+        self._ensure_started()
+        self.queue.put_nowait(result)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                if self.batch_size is None:
+                    self.batch_size = settings.RESULTS_BATCH_SIZE
+                if self.flush_interval is None:
+                    self.flush_interval = settings.RESULTS_FLUSH_SECONDS
+                if self.attempts is None:
+                    self.attempts = settings.RESULTS_WRITE_ATTEMPTS
+                if self.retry_delay is None:
+                    self.retry_delay = settings.RESULTS_RETRY_SECONDS
+                self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Drain whatever else is already waiting, up to one batch
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = item is None
+            if batch:
+                try:
+                    self.flush(batch)
+                except Exception:
+                    # Never let one batch take the writer thread down
+                    logger.exception("failed to flush %d match results", len(batch))
+
+    def flush(self, batch):
+        close_old_connections()
+        try:
+            written = self._write_batch(batch)
+        finally:
+            close_old_connections()
+        if not written:
+            return
+        for listener in self.listeners:
+            try:
+                listener(written)
+            except Exception:
+                logger.exception("match result listener %r failed", listener)
+
+    def _write_batch(self, batch):
+        """Write ``batch``; return the results that were written."""
+        try:
+            self._write_retrying(batch)
+            return batch
+        except IntegrityError:
+            pass
+        except Exception:
+            logger.exception("failed to write %d match results", len(batch))
+            return []
+        # A duplicate spoils the bulk insert; fall back to one by one
+        written = []
+        for result in batch:
+            try:
+                self._write_retrying([result])
+            except IntegrityError:
+                logger.warning("duplicate match result %s skipped", result["game_id"])
+            except Exception:
+                logger.exception("failed to write match result %s", result["game_id"])
+            else:
+                written.append(result)
+        return written
+
+    def _write_retrying(self, batch):
+        attempts = self.attempts or 1
+        for attempt in range(attempts):
+            try:
+                return self._write(batch)
+            except OperationalError as e:
+                if attempt + 1 == attempts:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning("writing %d match results failed (%s), retrying in %.1fs", len(batch), e, delay)
+                time.sleep(delay)
+
+    def _write(self, batch):
+        from .models import MatchResult, PlayerMatchStats
+
+        with transaction.atomic():
+            matches = MatchResult.objects.bulk_create([
+                MatchResult(
+                    game_id=result["game_id"],
+                    score_left=result["score_left"],
+                    score_right=result["score_right"],
+                    started_at=result["started_at"],
+                    ended_at=result["ended_at"],
+                )
+                for result in batch
+            ])
+            PlayerMatchStats.objects.bulk_create([
+                PlayerMatchStats(match=match, **player)
+                for match, result in zip(matches, batch)
+                for player in result["players"]
+            ])
+
+
+result_writer = ResultWriter()
@@ -0,0 +1,306 @@
+# rooms.py
+"""
+Match rooms and their tick scheduler.
+
+A Room is this worker's side of one match: the local consumers playing it
+and the state they last reported. Players still relay updates to each
+other at once. The room's tick does the per-match housekeeping that
+doesn't need to happen on every update:
+    - write the reported positions to the store, merged since the last tick
+    - send spectators each player's latest update, at SPECTATOR_RATE_HZ, if
+      the game has any (a counter in the game hash, re-read every
+      SPECTATOR_CHECK_SECONDS)
+    - finish the match once it has run MATCH_MAX_SECONDS
+If the two players are on different workers, each worker has a Room for
+the game. That is fine: store writes merge field by field and finishing is
+idempotent.
+
+A worker has one RoomManager (``room_manager``). A single task runs every
+room's tick. Ticks are scheduled on fixed deadlines: each next deadline is
+the previous one plus the interval, not "now" plus the interval, so timing
+errors don't add up. A room that falls behind skips the ticks it missed
+instead of running them back to back. Rooms nobody has moved in for
+ROOM_IDLE_SECONDS tick at ROOM_IDLE_TICK_HZ instead of ROOM_TICK_HZ, and go
+back to the full rate on the next movement.
+
+Each room keeps tick statistics (RoomManager.report(), logged with the
+profiling reports). Its CPU figure, ``tick_cpu``, is the thread CPU time of
+tick() itself: deciding what is due and starting the work. The store writes,
+spectator sends and result recording it starts run as separate tasks and
+aren't charged to the room.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from django.conf import settings
+
+from .results import result_from_state, result_writer
+from .tasks import spawn
+
+logger = logging.getLogger(__name__)
+
+# Field of the game hash counting its spectators, on every worker
+SPECTATORS_FIELD = "spectators"
+
+# Longest the tick loop runs without letting other tasks in, in seconds
+YIELD_EVERY = 0.001
+
+
+def _busy(task):
+    return task is not None and not task.done()
+
+
+class Room:
+    def __init__(self, manager, game_id, store, channel_layer):
+        self.manager = manager
+        self.game_id = game_id
+        self.store = store
+        self.channel_layer = channel_layer
+        self.state_key = f"game:{game_id}:state"
+        self.spectator_group = f"spectate_{game_id}"
+        self.members = set()
+
+        now = time.monotonic()
+        self.created_at = now
+        self.ends_at = now + settings.MATCH_MAX_SECONDS
+        self.last_activity = now
+        self.finished = False
+        self.closed = False
+
+        self.state = {}  # last value of each field reported here
+        self.dirty = {}  # fields not written to the store yet
+        self.spectators = 0  # as last read from the game hash
+        self.spectators_checked_at = 0.0
+        self.spectator_frames = {}  # latest update frame per player, not sent yet
+        self.last_spectator_send = 0.0
+        self.flush_task = None
+        self.spectator_task = None
+        self.spectator_check_task = None
+
+        # Scheduling and accounting, kept up to date by the manager
+        self.idle = False
+        self.deadline = None
+        self.generation = 0
+        self.ticks = 0
+        self.skipped = 0
+        self.tick_cpu = 0.0  # CPU time in tick() only, not the tasks it spawns
+        self.max_late = 0.0
+        self.total_late = 0.0
+
+    @property
+    def interval(self):
+        return 1 / (settings.ROOM_IDLE_TICK_HZ if self.idle else settings.ROOM_TICK_HZ)
+
+    # Called by the consumers
+    def record(self, mapping):
+        """Note the fields of a player update; they are written on the next tick."""
+        changed = False
+        for field, value in mapping.items():
+            if self.state.get(field) != value:
+                self.state[field] = value
+                self.dirty[field] = value
+                changed = True
+        if changed:
+            self.last_activity = time.monotonic()
+            if self.idle:
+                self.idle = False
+                self.manager.reschedule(self)
+
+    def set_spectator_frame(self, player_id, frame):
+        if self.spectators > 0:
+            self.spectator_frames[player_id] = frame
+
+    async def finish(self):
+        # Whoever gets here first records the result; HSETNX makes sure it
+        # is only recorded once, across workers too
+        self.finished = True
+        if not await self.store.hsetnx(self.state_key, "finished", "1"):
+            return
+        state = await self.store.hgetall(self.state_key)
+        result_writer.submit(result_from_state(self.game_id, state))
+
+    # Called by the manager
+    def tick(self, now):
+        if self.dirty and not _busy(self.flush_task):
+            mapping, self.dirty = self.dirty, {}
+            self.flush_task = spawn(self.store.hset(self.state_key, mapping))
+
+        if (not _busy(self.spectator_check_task)
+                and now - self.spectators_checked_at >= settings.SPECTATOR_CHECK_SECONDS):
+            self.spectators_checked_at = now
+            self.spectator_check_task = spawn(self.check_spectators())
+
+        if (self.spectator_frames and not _busy(self.spectator_task)
+                and now - self.last_spectator_send >= 1 / settings.SPECTATOR_RATE_HZ):
+            frames, self.spectator_frames = self.spectator_frames, {}
+            self.last_spectator_send = now
+            self.spectator_task = spawn(self.send_to_spectators(frames))
+
+        if not self.finished and now >= self.ends_at:
+            spawn(self.finish())
+
+        self.idle = now - self.last_activity >= settings.ROOM_IDLE_SECONDS
+
+    async def check_spectators(self):
+        # Spectators may be on other workers, so the count lives in the store
+        self.spectators = int(await self.store.hget(self.state_key, SPECTATORS_FIELD) or 0)
+
+    async def send_to_spectators(self, frames):
+        for player_id, frame in frames.items():
+            await self.channel_layer.group_send(
+                self.spectator_group,
+                {"type": "spectator.update", "from": player_id, "frame": frame},
+            )
+
+    def close(self):
+        self.closed = True
+        if self.dirty:
+            spawn(self.store.hset(self.state_key, self.dirty))
+            self.dirty = {}
+
+    def stats(self):
+        return {
+            "game_id": self.game_id,
+            "members": len(self.members),
+            "spectators": self.spectators,
+            "idle": self.idle,
+            "tick_hz": round(1 / self.interval, 1),
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "tick_cpu_ms": round(self.tick_cpu * 1000, 3),
+            "tick_cpu_us": round(self.tick_cpu / self.ticks * 1e6, 1) if self.ticks else 0.0,
+            "late_mean_ms": round(self.total_late / self.ticks * 1000, 3) if self.ticks else 0.0,
+            "late_max_ms": round(self.max_late * 1000, 3),
+            "age_s": round(time.monotonic() - self.created_at, 1),
+        }
+
+
+class RoomManager:
+    """Owns this worker's rooms and runs all their ticks from one task."""
+
+    def __init__(self):
+        self.rooms = {}
+        self.heap = []  # (deadline, seq, generation, room)
+        self._seq = itertools.count()
+        self._task = None
+        self._waiter = None
+        self._waiting_until = None
+
+    def join(self, game_id, consumer):
+        room = self.rooms.get(game_id)
+        if room is None:
+            room = self.rooms[game_id] = Room(self, game_id, consumer.store, consumer.channel_layer)
+            self.reschedule(room)
+        room.members.add(consumer)
+        return room
+
+    def leave(self, room, consumer):
+        room.members.discard(consumer)
+        if not room.members and self.rooms.get(room.game_id) is room:
+            del self.rooms[room.game_id]
+            room.close()
+
+    def set_spectators(self, game_id, count):
+        """A spectator joined or left here: no need to wait for the next check."""
+        room = self.rooms.get(game_id)
+        if room is not None:
+            room.spectators = count
+
+    def reschedule(self, room):
+        """(Re)start a room's ticks one interval from now."""
+        loop = asyncio.get_running_loop()
+        room.generation += 1
+        room.deadline = loop.time() + room.interval
+        heapq.heappush(self.heap, (room.deadline, next(self._seq), room.generation, room))
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        elif self._waiting_until is not None and room.deadline < self._waiting_until:
+            self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _sleep_until(self, when):
+        loop = asyncio.get_running_loop()
+        self._waiter = loop.create_future()
+        self._waiting_until = when
+        handle = loop.call_at(when, self._wake)
+        try:
+            await self._waiter
+        finally:
+            handle.cancel()
+            self._waiter = self._waiting_until = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        heap = self.heap
+        last_yield = loop.time()
+        while heap:
+            deadline, _, generation, room = heap[0]
+            if room.closed or generation != room.generation:
+                heapq.heappop(heap)
+                continue
+            now = loop.time()
+            if deadline > now:
+                await self._sleep_until(deadline)
+                last_yield = loop.time()
+                continue
+            if now - last_yield > YIELD_EVERY:
+                # Many rooms due at once: let the consumers run in between
+                await asyncio.sleep(0)
+                last_yield = loop.time()
+                continue
+            heapq.heappop(heap)
+
+            cpu_start = time.thread_time()
+            try:
+                room.tick(time.monotonic())
+            except Exception:
+                logger.exception("tick failed for room %s", room.game_id)
+            room.tick_cpu += time.thread_time() - cpu_start
+            late = now - deadline
+            room.ticks += 1
+            room.total_late += late
+            if late > room.max_late:
+                room.max_late = late
+
+            interval = room.interval
+            next_deadline = deadline + interval
+            if next_deadline <= now:
+                missed = int((now - deadline) / interval)
+                room.skipped += missed
+                next_deadline = deadline + (missed + 1) * interval
+            room.deadline = next_deadline
+            heapq.heappush(heap, (next_deadline, next(self._seq), generation, room))
+
+    def report(self, top=10):
+        """Totals over this worker's rooms, and the ``top`` rooms by tick CPU."""
+        rooms = [room.stats() for room in self.rooms.values()]
+        busiest = sorted(rooms, key=lambda stats: stats["tick_cpu_ms"], reverse=True)[:top]
+        return {
+            "rooms": len(rooms),
+            "idle": sum(1 for stats in rooms if stats["idle"]),
+            "ticks_per_sec": round(sum(stats["tick_hz"] for stats in rooms), 1),
+            "tick_cpu_ms": round(sum(stats["tick_cpu_ms"] for stats in rooms), 3),
+            "busiest": busiest,
+        }
+
+    def log_report(self):
+        report = self.report()
+        logger.info(
+            "%d rooms (%d idle), %.0f ticks/s, %.1fms tick CPU",
+            report["rooms"], report["idle"], report["ticks_per_sec"], report["tick_cpu_ms"],
+        )
+        for stats in report["busiest"]:
+            logger.info(
+                "room %s members=%d %.0fHz ticks=%d skipped=%d tick_cpu=%.3fms (%.1fus/tick) late mean=%.3fms max=%.3fms",
+                stats["game_id"], stats["members"], stats["tick_hz"], stats["ticks"], stats["skipped"],
+                stats["tick_cpu_ms"], stats["tick_cpu_us"], stats["late_mean_ms"], stats["late_max_ms"],
+            )
+
+
+room_manager = RoomManager()
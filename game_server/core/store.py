@@ -0,0 +1,273 @@
+# store.py
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class GameStore(ABC):
+    """
+    Storage used by the consumers: the matchmaking queue, per-game state
+    hashes and player sets, and capped chat streams. All methods are
+    coroutines; values are strings, like Redis with decode_responses.
+    """
+
+    # Queue (matchmaking)
+    @abstractmethod
+    async def queue_push(self, key, value):
+        """Append ``value``; return the queue length."""
+
+    @abstractmethod
+    async def queue_push_front(self, key, *values):
+        """Prepend ``values`` one by one, like LPUSH: the last ends up first."""
+
+    @abstractmethod
+    async def queue_pop(self, key):
+        """Remove and return the first value, or None."""
+
+    @abstractmethod
+    async def queue_remove(self, key, value):
+        """Remove every occurrence of ``value``; return how many there were."""
+
+    # Game hash
+    @abstractmethod
+    async def hset(self, key, mapping):
+        pass
+
+    @abstractmethod
+    async def hsetnx(self, key, field, value):
+        """Set ``field`` only if it is not set yet; return whether it was set."""
+
+    @abstractmethod
+    async def hget(self, key, field):
+        """The field's value, or None."""
+
+    @abstractmethod
+    async def hincrby(self, key, field, amount=1):
+        """Add ``amount`` to an integer field (missing counts as 0); return the new value."""
+
+    @abstractmethod
+    async def hgetall(self, key):
+        pass
+
+    # Sets
+    @abstractmethod
+    async def sadd(self, key, *members):
+        pass
+
+    @abstractmethod
+    async def expire(self, key, seconds):
+        pass
+
+    @abstractmethod
+    async def create_game(self, state_key, state, players_key, players, ttl):
+        """Write a new game's state hash and player set, both expiring after ``ttl``."""
+
+    # Streams (chat history)
+    @abstractmethod
+    async def stream_append(self, key, fields, maxlen, ttl):
+        """Append ``fields``, trim to about ``maxlen`` entries, return the entry id."""
+
+    @abstractmethod
+    async def stream_range(self, key, before=None, count=20):
+        """Up to ``count`` (id, fields) entries older than ``before``, newest first."""
+
+
+class RedisStore(GameStore):
+    def __init__(self, url, max_connections=100):
+        import redis.asyncio as aioredis
+
+        # One pool per worker process, shared by every consumer
+        self.pool = aioredis.ConnectionPool.from_url(
+            url, max_connections=max_connections, decode_responses=True
+        )
+        self.redis = aioredis.Redis(connection_pool=self.pool)
+
+    async def queue_push(self, key, value):
+        return await self.redis.rpush(key, value)
+
+    async def queue_push_front(self, key, *values):
+        return await self.redis.lpush(key, *values)
+
+    async def queue_pop(self, key):
+        return await self.redis.lpop(key)
+
+    async def queue_remove(self, key, value):
+        return await self.redis.lrem(key, 0, value)
+
+    async def hset(self, key, mapping):
+        return await self.redis.hset(key, mapping=mapping)
+
+    async def hsetnx(self, key, field, value):
+        return bool(await self.redis.hsetnx(key, field, value))
+
+    async def hget(self, key, field):
+        return await self.redis.hget(key, field)
+
+    async def hincrby(self, key, field, amount=1):
+        return await self.redis.hincrby(key, field, amount)
+
+    async def hgetall(self, key):
+        return await self.redis.hgetall(key)
+
+    async def sadd(self, key, *members):
+        return await self.redis.sadd(key, *members)
+
+    async def expire(self, key, seconds):
+        return await self.redis.expire(key, seconds)
+
+    async def create_game(self, state_key, state, players_key, players, ttl):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(state_key, mapping=state)
+            pipe.sadd(players_key, *players)
+            pipe.expire(state_key, ttl)
+            pipe.expire(players_key, ttl)
+            await pipe.execute()
+
+    async def stream_append(self, key, fields, maxlen, ttl):
+        # XADD and EXPIRE in one round trip
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xadd(key, fields, maxlen=maxlen, approximate=True)
+            pipe.expire(key, ttl)
+            results = await pipe.execute()
+        return results[0]
+
+    async def stream_range(self, key, before=None, count=20):
+        upper = f"({before}" if before else "+"
+        return await self.redis.xrevrange(key, max=upper, min="-", count=count)
+
+
+class MemoryStore(GameStore):
+    """
+    In-process store for single-node runs and benchmarks. Only the
+    consumers of this worker see the data, so it is no good with more than
+    one worker. Expiry is checked lazily when a key is read.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self._stream_seq = 0
+
+    def _get(self, key, factory=None):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        value = self.data.get(key)
+        if value is None and factory is not None:
+            value = self.data[key] = factory()
+        return value
+
+    def _prune(self, key):
+        if not self.data.get(key, True):
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    async def queue_push(self, key, value):
+        queue = self._get(key, deque)
+        queue.append(value)
+        return len(queue)
+
+    async def queue_push_front(self, key, *values):
+        queue = self._get(key, deque)
+        queue.extendleft(values)
+        return len(queue)
+
+    async def queue_pop(self, key):
+        queue = self._get(key)
+        if not queue:
+            return None
+        value = queue.popleft()
+        self._prune(key)
+        return value
+
+    async def queue_remove(self, key, value):
+        queue = self._get(key)
+        if not queue:
+            return 0
+        kept = deque(v for v in queue if v != value)
+        removed = len(queue) - len(kept)
+        self.data[key] = kept
+        self._prune(key)
+        return removed
+
+    async def hset(self, key, mapping):
+        fields = self._get(key, dict)
+        added = sum(1 for field in mapping if field not in fields)
+        fields.update({field: str(value) for field, value in mapping.items()})
+        return added
+
+    async def hsetnx(self, key, field, value):
+        fields = self._get(key, dict)
+        if field in fields:
+            return False
+        fields[field] = str(value)
+        return True
+
+    async def hget(self, key, field):
+        return (self._get(key) or {}).get(field)
+
+    async def hincrby(self, key, field, amount=1):
+        fields = self._get(key, dict)
+        value = int(fields.get(field, 0)) + amount
+        fields[field] = str(value)
+        return value
+
+    async def hgetall(self, key):
+        return dict(self._get(key) or {})
+
+    async def sadd(self, key, *members):
+        members_set = self._get(key, set)
+        added = len(set(members) - members_set)
+        members_set.update(members)
+        return added
+
+    async def expire(self, key, seconds):
+        if self._get(key) is None:
+            return False
+        self.expires[key] = time.monotonic() + seconds
+        return True
+
+    async def create_game(self, state_key, state, players_key, players, ttl):
+        await self.hset(state_key, state)
+        await self.sadd(players_key, *players)
+        await self.expire(state_key, ttl)
+        await self.expire(players_key, ttl)
+
+    async def stream_append(self, key, fields, maxlen, ttl):
+        stream = self._get(key, lambda: deque(maxlen=maxlen))
+        self._stream_seq += 1
+        entry_id = f"{int(time.time() * 1000)}-{self._stream_seq}"
+        stream.append((entry_id, {name: str(value) for name, value in fields.items()}))
+        await self.expire(key, ttl)
+        return entry_id
+
+    async def stream_range(self, key, before=None, count=20):
+        entries = []
+        for entry_id, fields in reversed(self._get(key) or ()):
+            if before is not None and _stream_id(entry_id) >= _stream_id(before):
+                continue
+            entries.append((entry_id, dict(fields)))
+            if len(entries) >= count:
+                break
+        return entries
+
+
+def _stream_id(entry_id):
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+_store = None
+
+
+def get_store():
+    """The worker's store, built from settings.GAME_STORE on first use."""
+    global _store
+    if _store is None:
+        config = settings.GAME_STORE
+        _store = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+    return _store
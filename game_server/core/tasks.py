@@ -0,0 +1,22 @@
+# tasks.py
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+_background_tasks = set()
+
+
+def spawn(coro):
+    """Run ``coro`` without waiting for it. A failure is logged, not raised."""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_done)
+    return task
+
+
+def _done(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("background task failed", exc_info=task.exception())
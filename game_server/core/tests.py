@@ -1,3 +1,835 @@
-from django.test import TestCase
+import asyncio
+import threading
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from channels.layers import InMemoryChannelLayer
+from channels.testing import WebsocketCommunicator
+from django.db import IntegrityError, OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import leaderboard, views
+from .chat import ChatFilter, RateLimiter
+from .consumers import GameConsumer, _player_id, _point
+from .history import append_chat, fetch_chat_history
+from .lagcomp import PLAYER_HEIGHT, PLAYER_WIDTH, StateHistory, kick_plausible, rewind_time
+from .models import MatchResult, PlayerMatchStats
+from .outbound import OutboundQueue
+from .profiling import BUCKETS_MS, MAX_SLOW_CALLS, Histogram, Profiler
+from .results import ResultWriter, result_from_state
+from .rooms import RoomManager, room_manager
+from .store import MemoryStore
+from .tasks import spawn
+
+
+class ChatFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.chat_filter = ChatFilter(["ass", "darn it", "heck\n", "", "he"])
+
+    def test_masks_whole_words(self):
+        self.assertEqual(self.chat_filter.filter("you ass!"), "you ***!")
+        self.assertEqual(self.chat_filter.filter("heck, he left"), "****, ** left")
+
+    def test_leaves_words_containing_a_match(self):
+        self.assertEqual(self.chat_filter.filter("first class pass"), "first class pass")
+        self.assertEqual(self.chat_filter.filter("hello there"), "hello there")
+
+    def test_is_case_insensitive_and_keeps_the_rest(self):
+        self.assertEqual(self.chat_filter.filter("Darn It, ASS"), "*******, ***")
+
+    def test_overlapping_words(self):
+        # "he" ends inside "heck" via a failure link but isn't a whole word there
+        self.assertEqual(list(self.chat_filter.matches("heck")), [(0, 4)])
+
+    def test_spans_stay_aligned_after_multichar_lowercase(self):
+        # "İ" lowercases to two characters
+        self.assertEqual(self.chat_filter.filter("İ ass"), "İ ***")
+
+    def test_no_words(self):
+        self.assertEqual(ChatFilter([]).filter("anything"), "anything")
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_allows_a_burst_then_refills(self):
+        with mock.patch("core.chat.time.monotonic", return_value=100.0) as clock:
+            limiter = RateLimiter(3, 6)
+            self.assertEqual([limiter.allow() for _ in range(4)], [True, True, True, False])
+            clock.return_value = 101.0  # half a token
+            self.assertFalse(limiter.allow())
+            clock.return_value = 102.0
+            self.assertTrue(limiter.allow())
+            self.assertFalse(limiter.allow())
+
+    def test_burst_is_capped(self):
+        with mock.patch("core.chat.time.monotonic", return_value=0.0) as clock:
+            limiter = RateLimiter(2, 1)
+            clock.return_value = 60.0
+            self.assertEqual([limiter.allow() for _ in range(3)], [True, True, False])
+
+
+
+class HistogramTests(SimpleTestCase):
+    def test_percentiles_are_bucket_upper_bounds(self):
+        hist = Histogram()
+        for ms in (0.05, 0.3, 0.3, 4.0):
+            hist.observe(ms)
+        self.assertEqual(hist.percentile(25), 0.1)
+        self.assertEqual(hist.percentile(50), 0.5)
+        self.assertEqual(hist.percentile(75), 0.5)
+        self.assertEqual(hist.percentile(99), 5)
+        self.assertEqual(hist.summary()["mean_ms"], 1.163)
+
+    def test_past_the_last_bucket_reports_the_max(self):
+        hist = Histogram()
+        hist.observe(1.0)
+        hist.observe(BUCKETS_MS[-1] * 3)
+        self.assertEqual(hist.percentile(99), BUCKETS_MS[-1] * 3)
+        self.assertEqual(hist.summary()["buckets"]["inf"], 1)
+
+    def test_empty(self):
+        self.assertEqual(Histogram().percentile(50), 0.0)
+        self.assertEqual(Histogram().summary()["mean_ms"], 0.0)
+
+
+class ProfilerTests(SimpleTestCase):
+    async def test_fast_calls_are_only_counted(self):
+        profiler = Profiler(enabled=True, slow_ms=1000)
+
+        async def fast():
+            return 42
+
+        self.assertEqual(await profiler.run("action:ping", fast()), 42)
+        self.assertEqual(profiler.histograms["action:ping"].calls, 1)
+        self.assertEqual(profiler.slow_calls, [])
+
+    async def test_slow_calls_sample_what_they_wait_on(self):
+        profiler = Profiler(enabled=True, slow_ms=5)
+
+        async def waiting_on_redis():
+            await asyncio.sleep(0.03)
+
+        async def handler():
+            await waiting_on_redis()
+
+        with self.assertLogs("core.profiling", "WARNING"):
+            await profiler.run("action:update", handler())
+        [slow] = profiler.slow_calls
+        self.assertEqual(slow["name"], "action:update")
+        self.assertGreaterEqual(slow["ms"], 5)
+        # The task's chain of awaits, outermost first
+        functions = [line.rsplit(" in ", 1)[1] for line in slow["stack"]]
+        self.assertLess(functions.index("handler"), functions.index("waiting_on_redis"))
+        self.assertEqual(functions[-1], "sleep")
+
+    async def test_failed_calls_are_recorded_too(self):
+        profiler = Profiler(enabled=True, slow_ms=1000)
+
+        async def broken():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            await profiler.run("action:chat", broken())
+        self.assertEqual(profiler.histograms["action:chat"].calls, 1)
+
+    def test_slow_calls_are_capped(self):
+        profiler = Profiler(slow_ms=1)
+        with self.assertLogs("core.profiling", "WARNING"):
+            for n in range(MAX_SLOW_CALLS + 5):
+                profiler.record(f"call {n}", 2.0)
+        self.assertEqual(len(profiler.slow_calls), MAX_SLOW_CALLS)
+        self.assertEqual(profiler.slow_calls[0]["name"], "call 5")
+        self.assertEqual(profiler.slow_calls[-1]["name"], f"call {MAX_SLOW_CALLS + 4}")
+
+class OutboundQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.sent = []
+
+    async def send(self, text_data=None, bytes_data=None):
+        self.sent.append(text_data if bytes_data is None else bytes_data)
+
+    async def test_sends_in_order_and_coalesces_snapshots(self):
+        queue = OutboundQueue(self.send)
+        queue.put("chat 1")
+        queue.put("snapshot 1", coalesce_key="game")
+        queue.put(b"binary")
+        queue.put("snapshot 2", coalesce_key="game")
+        queue.put("chat 2")
+        queue.start()
+        await asyncio.sleep(0)
+        await queue.stop()
+        # The newer snapshot takes the older one's place in line
+        self.assertEqual(self.sent, ["chat 1", "snapshot 2", b"binary", "chat 2"])
+        self.assertEqual(queue.dropped, 1)
+
+    def test_refuses_frames_past_the_limit(self):
+        queue = OutboundQueue(self.send, max_frames=2)
+        self.assertTrue(queue.put("a"))
+        self.assertTrue(queue.put("b"))
+        self.assertFalse(queue.put("snapshot", coalesce_key="game"))
+        self.assertFalse(queue.put("c"))
+
+    def test_refuses_frames_while_a_send_is_stuck(self):
+        queue = OutboundQueue(self.send, stall_seconds=5.0)
+        with mock.patch("core.outbound.time.monotonic", return_value=100.0):
+            queue.sending_since = 94.0
+            self.assertFalse(queue.put("a"))
+            queue.sending_since = 96.0
+            self.assertTrue(queue.put("a"))
+
+    async def test_a_failed_send_stops_the_writer(self):
+        async def broken_send(**kwargs):
+            raise ConnectionResetError
+
+        queue = OutboundQueue(broken_send)
+        queue.put("a")
+        queue.put("b")
+        queue.start()
+        with self.assertLogs("core.outbound", "INFO"):
+            await asyncio.sleep(0)
+        self.assertTrue(queue.failed)
+        self.assertEqual(len(queue.frames), 0)
+        self.assertFalse(queue.put("c"))
+        await queue.stop()
+
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ConsumerTestCase(SimpleTestCase):
+    """GameConsumer over WebsocketCommunicator, with the in-memory store and layer."""
+
+    def setUp(self):
+        self.store = MemoryStore()
+        patcher = mock.patch("core.consumers.get_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def communicator(self):
+        return WebsocketCommunicator(GameConsumer.as_asgi(), "/ws/game/")
+
+    async def connected(self):
+        communicator = self.communicator()
+        await communicator.connect()
+        self.assertEqual((await communicator.receive_json_from())["type"], "connected")
+        return communicator
+
+
+class ConnectionLimitTests(ConsumerTestCase):
+
+    async def test_full_worker_says_why_and_closes_with_1013(self):
+        admitted = await self.connected()
+        with self.settings(WS_MAX_CONNECTIONS=1):
+            refused = self.communicator()
+            connected, _ = await refused.connect()
+            self.assertTrue(connected)
+            self.assertEqual(await refused.receive_json_from(), {"type": "server_full"})
+            self.assertEqual(await refused.receive_output(), {"type": "websocket.close", "code": 1013})
+            await refused.disconnect()
+        await admitted.disconnect()
+
+    @override_settings(WS_OUTBOUND_MAX_FRAMES=2)
+    async def test_client_that_stops_reading_is_dropped_with_1008(self):
+        async def stuck_send(self, text_data=None, bytes_data=None, close=False):
+            await asyncio.Event().wait()
+
+        with mock.patch.object(GameConsumer, "send", stuck_send):
+            communicator = self.communicator()
+            await communicator.connect()
+            # "connected" is stuck in the writer; two pongs queue behind it
+            # and the third is one too many
+            for _ in range(3):
+                await communicator.send_json_to({"action": "ping", "payload": {"t": 1}})
+            self.assertEqual(await communicator.receive_output(), {"type": "websocket.close", "code": 1008})
+            await communicator.disconnect()
+
+
+class SpectatorCountTests(ConsumerTestCase):
+    @mock.patch("core.rooms.result_writer")
+    async def test_spectators_are_counted_in_the_game_hash(self, result_writer):
+        first, second = await self.connected(), await self.connected()
+        await first.send_json_to({"action": "find_game"})
+        await first.receive_json_from()
+        await second.send_json_to({"action": "find_game"})
+        game_id = (await second.receive_json_from())["game_id"]
+        state_key = f"game:{game_id}:state"
+        room = room_manager.rooms[game_id]
+        self.assertEqual(room.spectators, 0)
+
+        spectator = await self.connected()
+        await spectator.send_json_to({"action": "spectate", "payload": {"game_id": game_id}})
+        self.assertEqual((await spectator.receive_json_from())["type"], "keyframe")
+        self.assertEqual(await self.store.hget(state_key, "spectators"), "1")
+        self.assertEqual(room.spectators, 1)
+
+        await spectator.disconnect()
+        self.assertEqual(await self.store.hget(state_key, "spectators"), "0")
+        self.assertEqual(room.spectators, 0)
+        await first.disconnect()
+        await second.disconnect()
+
+class MemoryStoreTests(SimpleTestCase):
+    """MemoryStore stands in for Redis, so it has to answer like Redis does."""
+
+    def setUp(self):
+        self.store = MemoryStore()
+
+    async def test_queue_is_fifo_and_push_front_is_lpush(self):
+        await self.store.queue_push("q", "a")
+        await self.store.queue_push("q", "b")
+        self.assertEqual(await self.store.queue_push_front("q", "x", "y"), 4)
+        popped = [await self.store.queue_pop("q") for _ in range(5)]
+        self.assertEqual(popped, ["y", "x", "a", "b", None])
+        self.assertNotIn("q", self.store.data)
+
+    async def test_queue_remove(self):
+        for value in ("a", "b", "a"):
+            await self.store.queue_push("q", value)
+        self.assertEqual(await self.store.queue_remove("q", "a"), 2)
+        self.assertEqual(await self.store.queue_remove("missing", "a"), 0)
+        self.assertEqual(await self.store.queue_pop("q"), "b")
+
+    async def test_hashes_store_strings(self):
+        self.assertEqual(await self.store.hset("h", {"x": 1, "y": 2}), 2)
+        self.assertEqual(await self.store.hset("h", {"x": 3, "z": 4}), 1)
+        self.assertFalse(await self.store.hsetnx("h", "x", 5))
+        self.assertTrue(await self.store.hsetnx("h", "w", 6))
+        self.assertEqual(await self.store.hgetall("h"), {"x": "3", "y": "2", "z": "4", "w": "6"})
+        self.assertEqual(await self.store.hgetall("missing"), {})
+
+    async def test_keys_expire(self):
+        with mock.patch("core.store.time.monotonic", return_value=100.0) as clock:
+            await self.store.create_game("state", {"x": 1}, "players", ["a", "b"], ttl=10)
+            self.assertFalse(await self.store.expire("missing", 10))
+            clock.return_value = 109.0
+            self.assertEqual(await self.store.hgetall("state"), {"x": "1"})
+            clock.return_value = 110.0
+            self.assertEqual(await self.store.hgetall("state"), {})
+            self.assertEqual(await self.store.sadd("players", "a"), 1)
+
+    async def test_stream_pages_newest_first_with_an_exclusive_cursor(self):
+        ids = [await self.store.stream_append("s", {"n": n}, maxlen=4, ttl=60) for n in range(6)]
+        page = await self.store.stream_range("s", count=3)
+        self.assertEqual([fields["n"] for _, fields in page], ["5", "4", "3"])
+        self.assertEqual([entry_id for entry_id, _ in page], ids[:2:-1])
+        page = await self.store.stream_range("s", before=page[-1][0], count=3)
+        # Only four entries are kept, and the cursor itself isn't repeated
+        self.assertEqual([fields["n"] for _, fields in page], ["2"])
+        self.assertEqual(await self.store.stream_range("missing"), [])
+
+
+
+@override_settings(CHAT_HISTORY_PAGE_MAX=3)
+class ChatHistoryTests(SimpleTestCase):
+    def setUp(self):
+        self.store = MemoryStore()
+
+    async def chat(self, count):
+        for n in range(count):
+            await append_chat(self.store, "g", "p", f"line {n}")
+
+    async def test_pages_back_to_the_start(self):
+        await self.chat(5)
+        messages, cursor = await fetch_chat_history(self.store, "g", count=2)
+        self.assertEqual([m["message"] for m in messages], ["line 3", "line 4"])
+        self.assertEqual(cursor, messages[0]["id"])
+        messages, cursor = await fetch_chat_history(self.store, "g", before=cursor, count=2)
+        self.assertEqual([m["message"] for m in messages], ["line 1", "line 2"])
+        messages, cursor = await fetch_chat_history(self.store, "g", before=cursor, count=2)
+        self.assertEqual([m["message"] for m in messages], ["line 0"])
+        self.assertIsNone(cursor)
+
+    async def test_count_is_clamped(self):
+        await self.chat(5)
+        for count, expected in ((0, 1), (-4, 1), (100, 3), ("2", 2), ("junk", 3), (None, 3)):
+            messages, _ = await fetch_chat_history(self.store, "g", count=count)
+            self.assertEqual(len(messages), expected, count)
+
+    async def test_malformed_cursor_means_newest(self):
+        await self.chat(2)
+        for before in ("junk", "1-2-3", "-1", 12, ["1-1"], "0-0 OR 1"):
+            messages, _ = await fetch_chat_history(self.store, "g", before=before)
+            self.assertEqual([m["message"] for m in messages], ["line 0", "line 1"], before)
+
+    async def test_empty_stream(self):
+        self.assertEqual(await fetch_chat_history(self.store, "g"), ([], None))
+
+class StateHistoryTests(SimpleTestCase):
+    def test_interpolates_between_samples(self):
+        history = StateHistory(size=4)
+        history.record(1.0, (0.0, 100.0))
+        history.record(2.0, (100.0, 200.0))
+        self.assertEqual(history.ball_at(1.25), (25.0, 125.0))
+        self.assertEqual(history.ball_at(2.0), (100.0, 200.0))
+
+    def test_clamps_outside_the_kept_samples(self):
+        history = StateHistory(size=4)
+        self.assertIsNone(history.ball_at(1.0))
+        history.record(1.0, (10.0, 10.0))
+        history.record(2.0, (20.0, 20.0))
+        self.assertEqual(history.ball_at(0.5), (10.0, 10.0))
+        self.assertEqual(history.ball_at(5.0), (20.0, 20.0))
+
+    def test_overwrites_the_oldest_sample(self):
+        history = StateHistory(size=3)
+        for t in range(5):
+            history.record(float(t), (t * 10.0, 0.0))
+        self.assertEqual(history.count, 3)
+        self.assertEqual(history.ball_at(0.0), (20.0, 0.0))
+        self.assertEqual(history.ball_at(3.5), (35.0, 0.0))
+
+    def test_same_time_samples(self):
+        history = StateHistory(size=4)
+        history.record(1.0, (0.0, 0.0))
+        history.record(1.0, (50.0, 0.0))
+        self.assertEqual(history.ball_at(1.0), (50.0, 0.0))
+
+
+class LagCompensationTests(SimpleTestCase):
+    def test_rewind_time_is_capped(self):
+        self.assertEqual(rewind_time(10.0, 0.1, 0.3), 9.9)
+        self.assertEqual(rewind_time(10.0, 2.0, 0.3), 9.7)
+        self.assertEqual(rewind_time(10.0, -1.0, 0.3), 10.0)
+        self.assertEqual(rewind_time(10.0, "junk", 0.3), 9.7)
+        self.assertEqual(rewind_time(10.0, None, 0.3), 9.7)
+        for rtt in (float("nan"), float("inf"), float("-inf"), "NaN"):
+            self.assertEqual(rewind_time(10.0, rtt, 0.3), 9.7)
+
+    def test_kick_checked_against_the_rewound_ball(self):
+        history = StateHistory()
+        history.record(1.0, (100.0, 300.0))
+        history.record(2.0, (600.0, 300.0))
+        player = (80.0, 250.0)
+        self.assertTrue(kick_plausible(history, 1.0, player, reach=20))
+        self.assertFalse(kick_plausible(history, 2.0, player, reach=20))
+
+    def test_hitbox_includes_headroom_and_reach(self):
+        history = StateHistory()
+        x, y = 100.0, 300.0
+        history.record(1.0, (x + PLAYER_WIDTH / 2, y - 15.0))  # 5px above the headroom
+        self.assertTrue(kick_plausible(history, 1.0, (x, y), reach=5))
+        self.assertFalse(kick_plausible(history, 1.0, (x, y), reach=4))
+        history.record(2.0, (x + PLAYER_WIDTH + 3.0, y + PLAYER_HEIGHT + 4.0))  # 5px off a corner
+        self.assertTrue(kick_plausible(history, 2.0, (x, y), reach=5))
+        self.assertFalse(kick_plausible(history, 2.0, (x, y), reach=4.9))
+
+    def test_non_finite_ball_positions_are_ignored(self):
+        self.assertEqual(_point({"x": "1.5", "y": 2}), (1.5, 2.0))
+        for bad in ({"x": float("nan"), "y": 0}, {"x": 0, "y": "inf"}, {"x": 0}, {"x": "a", "y": 0}, None):
+            self.assertIsNone(_point(bad))
+
+    def test_allowed_without_history(self):
+        self.assertTrue(kick_plausible(StateHistory(), 1.0, (0.0, 0.0), reach=0))
+
+
+
+class SpawnTests(SimpleTestCase):
+    async def test_failures_are_logged(self):
+        async def broken():
+            raise ValueError("boom")
+
+        with self.assertLogs("core.tasks", "ERROR") as logs:
+            task = spawn(broken())
+            await asyncio.sleep(0)  # the task runs
+            await asyncio.sleep(0)  # then its done callback
+        self.assertTrue(task.done())
+        self.assertIn("ValueError: boom", logs.output[0])
+
+class _Member:
+    def __init__(self):
+        self.store = MemoryStore()
+        self.channel_layer = InMemoryChannelLayer()
+
+
+@override_settings(ROOM_TICK_HZ=10, ROOM_IDLE_TICK_HZ=2, ROOM_IDLE_SECONDS=60, MATCH_MAX_SECONDS=60)
+class RoomManagerTests(SimpleTestCase):
+    def setUp(self):
+        self.manager = RoomManager()
+        self.member = _Member()
+
+    def tearDown(self):
+        if self.manager._task is not None:
+            self.manager._task.cancel()
+
+    async def test_ticks_on_fixed_deadlines(self):
+        room = self.manager.join("g", self.member)
+        first = room.deadline
+        await asyncio.sleep(0.35)
+        self.assertGreaterEqual(room.ticks, 2)
+        # Each deadline is the previous one plus the interval, whenever the tick ran
+        self.assertAlmostEqual(room.deadline - first, (room.ticks + room.skipped) * 0.1, places=6)
+
+    async def test_skips_missed_ticks(self):
+        room = self.manager.join("g", self.member)
+        loop = asyncio.get_running_loop()
+        room.deadline = loop.time() - 0.25
+        self.manager.heap[:] = [(room.deadline, 0, room.generation, room)]
+        self.manager._wake()
+        missed_deadline = room.deadline
+        await asyncio.sleep(0.01)
+        self.assertEqual((room.ticks, room.skipped), (1, 2))
+        self.assertAlmostEqual(room.deadline, missed_deadline + 0.3, places=6)
+        self.assertGreaterEqual(room.max_late, 0.25)
+
+    async def test_idle_room_slows_down_until_it_moves(self):
+        with self.settings(ROOM_IDLE_SECONDS=0):
+            room = self.manager.join("g", self.member)
+            await asyncio.sleep(0.15)
+            self.assertEqual(room.ticks, 1)
+            self.assertTrue(room.idle)
+            self.assertEqual(room.interval, 0.5)
+            self.assertEqual(self.manager.report()["idle"], 1)
+
+            generation = room.generation
+            room.record({"player:a:x": "1"})
+            self.assertFalse(room.idle)
+            self.assertEqual(room.generation, generation + 1)
+            await asyncio.sleep(0.15)
+            # Ticked again at the full rate; the idle deadline was dropped
+            self.assertEqual(room.ticks, 2)
+
+    async def test_tick_writes_merged_updates(self):
+        room = self.manager.join("g", self.member)
+        room.record({"player:a:x": "1", "player:a:y": "2"})
+        room.record({"player:a:x": "3"})
+        room.tick(room.created_at)
+        room.record({"player:a:x": "3"})
+        self.assertEqual(room.dirty, {})
+        await asyncio.sleep(0)
+        state = await self.member.store.hgetall("game:g:state")
+        self.assertEqual(state, {"player:a:x": "3", "player:a:y": "2"})
+
+    async def test_spectator_frames_are_only_sent_while_watched(self):
+        room = self.manager.join("g", self.member)
+        sent = []
+
+        async def group_send(group, event):
+            sent.append((group, event["frame"]))
+
+        self.member.channel_layer.group_send = group_send
+        room.set_spectator_frame("a", "frame 1")
+        room.tick(room.created_at + 1)
+        await asyncio.sleep(0)
+        self.assertEqual(sent, [])
+
+        await self.member.store.hincrby("game:g:state", "spectators", 1)
+        room.tick(room.created_at + 2)  # re-reads the count
+        await asyncio.sleep(0)
+        self.assertEqual(room.spectators, 1)
+        room.set_spectator_frame("a", "frame 2")
+        room.tick(room.created_at + 2.5)
+        await asyncio.sleep(0)
+        self.assertEqual(sent, [("spectate_g", "frame 2")])
+
+    async def test_finishes_the_match_once(self):
+        room = self.manager.join("g", self.member)
+        with mock.patch("core.rooms.result_writer") as writer:
+            room.tick(room.ends_at)
+            room.tick(room.ends_at + 1)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            self.assertEqual(writer.submit.call_count, 1)
+
+    async def test_last_member_leaving_closes_and_flushes(self):
+        other = _Member()
+        room = self.manager.join("g", self.member)
+        self.assertIs(self.manager.join("g", other), room)
+        room.record({"player:a:x": "1"})
+        self.manager.leave(room, other)
+        self.assertFalse(room.closed)
+        self.manager.leave(room, self.member)
+        self.assertTrue(room.closed)
+        self.assertEqual(self.manager.rooms, {})
+        await asyncio.sleep(0)
+        self.assertEqual(await self.member.store.hgetall("game:g:state"), {"player:a:x": "1"})
+
+
+def _result(game_id=None):
+    state = {"score_left": "3", "score_right": "1", "player:a:role": "left", "player:b:role": "right"}
+    return result_from_state(game_id or str(uuid.uuid4()), state)
+
+
+class ResultWriterTests(TestCase):
+    def setUp(self):
+        self.writer = ResultWriter(batch_size=2, flush_interval=0.05, attempts=3, retry_delay=0)
+        self.written = []
+        self.writer.listeners.append(self.written.append)
+
+    def test_flush_writes_matches_and_players(self):
+        result = _result()
+        self.writer.flush([result])
+        match = MatchResult.objects.get(game_id=result["game_id"])
+        self.assertEqual((match.score_left, match.score_right), (3, 1))
+        self.assertEqual(
+            sorted(match.players.values_list("player_id", "result")), [("a", "win"), ("b", "loss")],
+        )
+        self.assertEqual(self.written, [[result]])
+
+    def test_duplicate_is_skipped_and_the_rest_written(self):
+        first, second = _result(), _result()
+        self.writer.flush([first])
+        with self.assertLogs("core.results", "WARNING"):
+            self.writer.flush([second, first])
+        self.assertEqual(MatchResult.objects.count(), 2)
+        self.assertEqual(PlayerMatchStats.objects.count(), 4)
+        self.assertEqual(self.written, [[first], [second]])
+
+    def test_retries_a_locked_database(self):
+        result = _result()
+        real_write = self.writer._write
+        calls = []
+
+        def locked_once(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return real_write(batch)
+
+        with mock.patch.object(self.writer, "_write", side_effect=locked_once), \
+                self.assertLogs("core.results", "WARNING"):
+            self.writer.flush([result])
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(MatchResult.objects.filter(game_id=result["game_id"]).exists())
+        self.assertEqual(self.written, [[result]])
+
+
+class ResultWriterThreadTests(SimpleTestCase):
+    """The writer thread, with the database write stubbed out."""
+
+    def setUp(self):
+        self.writer = ResultWriter(batch_size=2, flush_interval=0.05, attempts=2, retry_delay=0)
+        self.batches = []
+        self.flushed = threading.Event()
+
+    def tearDown(self):
+        self.writer.stop()
+
+    def _write(self, batch):
+        self.batches.append([result["game_id"] for result in batch])
+        if len(self.batches) >= self.expected:
+            self.flushed.set()
+
+    def test_drains_the_queue_in_batches(self):
+        self.expected = 3
+        for game_id in "abcde":
+            self.writer.queue.put(_result(game_id))
+        with mock.patch.object(self.writer, "_write", side_effect=self._write):
+            self.writer._ensure_started()
+            self.assertTrue(self.flushed.wait(2))
+        self.assertEqual(self.batches, [["a", "b"], ["c", "d"], ["e"]])
+
+    def test_thread_survives_errors_in_the_fallback(self):
+        errors = [IntegrityError("duplicate"), OperationalError("database is locked"),
+                  OperationalError("database is locked"), ValueError("boom")]
+
+        def failing_write(batch):
+            if errors:
+                raise errors.pop(0)
+            self._write(batch)
+
+        self.expected = 1
+        self.writer.queue.put(_result("a"))
+        self.writer.queue.put(_result("b"))
+        with mock.patch.object(self.writer, "_write", side_effect=failing_write), \
+                self.assertLogs("core.results", "WARNING"):
+            # The bulk insert hits a duplicate; then "a" stays locked past
+            # its last attempt and "b" fails with something unexpected
+            self.writer._ensure_started()
+            self.writer.submit(_result("c"))
+            self.assertTrue(self.flushed.wait(2))
+        self.assertTrue(self.writer._thread.is_alive())
+        self.assertEqual(self.batches, [["c"]])
+
+
+class _SortedSets:
+    """The sorted set commands the leaderboard uses, on dicts."""
+
+    def __init__(self):
+        self.sets = {}
+
+    def _ordered(self, key):
+        # ZREVRANGE order: highest score first, ties by member, descending
+        return sorted(self.sets.get(key, {}).items(), key=lambda item: (item[1], item[0]), reverse=True)
+
+    def zscore(self, key, member):
+        return self.sets.get(key, {}).get(member)
+
+    def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self.sets.get(key, {}))
+
+    def zrevrange(self, key, start, stop, withscores=False):
+        return self._ordered(key)[start:stop + 1]
+
+    def zrevrank(self, key, member):
+        members = [item[0] for item in self._ordered(key)]
+        return members.index(member) if member in members else None
+
+    def delete(self, *keys):
+        for key in keys:
+            self.sets.pop(key, None)
+
+    def rename(self, src, dst):
+        self.sets[dst] = self.sets.pop(src)
+
+    def transaction(self, func, *watches):
+        func(self)
+
+    def multi(self):
+        pass
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        pass
+
+
+def _rated(game_id, left, right, score_left, score_right):
+    state = {
+        "score_left": str(score_left), "score_right": str(score_right),
+        "player:c1:role": "left", "player:c2:role": "right",
+    }
+    if left:
+        state["player:c1:player_id"] = left
+    if right:
+        state["player:c2:player_id"] = right
+    return result_from_state(game_id, state)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.redis = _SortedSets()
+
+    def ratings(self):
+        return self.redis.sets.get(leaderboard.LEADERBOARD_KEY, {})
+
+    def test_elo(self):
+        self.assertEqual(leaderboard._elo(1000, 1000, 1.0), (1016.0, 984.0))
+        self.assertEqual(leaderboard._elo(1000, 1000, 0.5), (1000.0, 1000.0))
+        # An upset moves the ratings further than the expected result
+        upset, expected = leaderboard._elo(1000, 1400, 1.0), leaderboard._elo(1400, 1000, 1.0)
+        self.assertEqual(upset, (1029.09, 1370.91))
+        self.assertEqual(expected, (1402.91, 997.09))
+
+    def test_only_matches_between_stable_ids_are_rated(self):
+        leaderboard.apply_results([
+            _rated(str(uuid.uuid4()), "alice", "bob", 2, 0),
+            _rated(str(uuid.uuid4()), "alice", None, 2, 0),
+            _rated(str(uuid.uuid4()), "alice", "alice", 2, 0),
+        ], client=self.redis)
+        self.assertEqual(self.ratings(), {"alice": 1016.0, "bob": 984.0})
+
+    def test_results_record_the_stable_id(self):
+        players = _rated(str(uuid.uuid4()), "alice", None, 1, 1)["players"]
+        self.assertEqual(
+            [(p["player_id"], p["ranked"], p["result"]) for p in players],
+            [("alice", True, "draw"), ("c2", False, "draw")],
+        )
+
+    def test_rebuild_replays_stored_matches_in_order(self):
+        writer = ResultWriter()
+        writer.listeners.append(lambda written: leaderboard.apply_results(written, client=self.redis))
+        for i, (left, right, score) in enumerate([("alice", "bob", (2, 1)), ("bob", "carol", (0, 0)),
+                                                  ("carol", "alice", (3, 1)), ("alice", None, (5, 0))]):
+            result = _rated(str(uuid.uuid4()), left, right, *score)
+            result["ended_at"] = result["ended_at"].replace(year=2020, minute=i)
+            writer.flush([result])
+        live = dict(self.ratings())
+        self.redis.sets.clear()
+        self.assertEqual(leaderboard.rebuild_from_db(client=self.redis), 3)
+        self.assertEqual(self.ratings(), live)
+
+    def test_rebuild_with_no_matches_empties_the_board(self):
+        self.redis.zadd(leaderboard.LEADERBOARD_KEY, {"stale": 1200.0})
+        self.assertEqual(leaderboard.rebuild_from_db(client=self.redis), 0)
+        self.assertEqual(self.ratings(), {})
+
+    def test_around(self):
+        self.redis.zadd(leaderboard.LEADERBOARD_KEY, {"a": 1100.0, "b": 1050.0, "c": 1000.0, "d": 900.0})
+        around = leaderboard.around("c", radius=1, client=self.redis)
+        self.assertEqual(around["rank"], 3)
+        self.assertEqual([row["player_id"] for row in around["entries"]], ["b", "c", "d"])
+        self.assertEqual(around["entries"][0]["rank"], 2)
+        self.assertIsNone(leaderboard.around("nobody", client=self.redis))
+
+
+class PlayerIdTests(SimpleTestCase):
+    def test_stable_id_is_a_hash_of_the_token(self):
+        scope = {"headers": [(b"host", b"x"), (b"x-player-token", b"0123456789abcdef0123")]}
+        self.assertEqual(_player_id(scope), _player_id(dict(scope)))
+        self.assertEqual(len(_player_id(scope)), 24)
+        self.assertNotIn("0123456789abcdef", _player_id(scope))
+
+    def test_missing_or_odd_tokens_are_ignored(self):
+        self.assertIsNone(_player_id({"headers": []}))
+        self.assertIsNone(_player_id({"headers": [(b"x-player-token", b"short")]}))
+        self.assertIsNone(_player_id({"headers": [(b"x-player-token", b"x" * 129)]}))
+
+
+class TTLCacheTests(SimpleTestCase):
+    def test_entries_expire(self):
+        with mock.patch("core.leaderboard.time.monotonic", return_value=100.0) as clock:
+            cache = leaderboard.TTLCache(ttl=5)
+            body, etag = cache.set("k", {"a": 1})
+            self.assertEqual(body, '{"a":1}')
+            self.assertEqual(cache.get("k"), (body, etag))
+            clock.return_value = 105.0
+            self.assertEqual(cache.get("k"), (body, etag))
+            clock.return_value = 105.1
+            self.assertIsNone(cache.get("k"))
+
+    def test_etag_follows_the_body(self):
+        cache = leaderboard.TTLCache(ttl=5)
+        self.assertEqual(cache.set("a", [1])[1], cache.set("b", [1])[1])
+        self.assertNotEqual(cache.set("a", [1])[1], cache.set("a", [2])[1])
+
+    def test_is_bounded(self):
+        with mock.patch("core.leaderboard.time.monotonic", return_value=100.0) as clock:
+            cache = leaderboard.TTLCache(ttl=5, max_entries=3)
+            cache.set("old", 0)
+            clock.return_value = 110.0
+            for key in ("a", "b"):
+                cache.set(key, 0)
+            cache.set("c", 0)  # full: the expired entry makes room
+            self.assertEqual(set(cache.entries), {"a", "b", "c"})
+            cache.set("d", 0)  # full of live entries: start over
+            self.assertEqual(set(cache.entries), {"d"})
+
+
+class LeaderboardViewTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = _SortedSets()
+        self.redis.zadd(leaderboard.LEADERBOARD_KEY, {"alice": 1016.0, "bob": 984.0})
+        patcher = mock.patch("core.leaderboard.get_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        views._cache.entries.clear()
+        self.addCleanup(views._cache.entries.clear)
+
+    def test_top_carries_an_etag(self):
+        response = self.client.get("/leaderboard/?limit=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "total": 2, "entries": [{"rank": 1, "player_id": "alice", "rating": 1016.0}],
+        })
+        self.assertTrue(response["ETag"])
+        self.assertEqual(response["Cache-Control"], f"public, max-age={views._cache.ttl}")
+
+    def test_matching_if_none_match_gets_304(self):
+        etag = self.client.get("/leaderboard/")["ETag"]
+        response = self.client.get("/leaderboard/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+        response = self.client.get("/leaderboard/", HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_responses_are_cached(self):
+        first = self.client.get("/leaderboard/bob/")
+        self.redis.zadd(leaderboard.LEADERBOARD_KEY, {"bob": 2000.0})
+        self.assertEqual(self.client.get("/leaderboard/bob/").content, first.content)
+        self.assertEqual(first.json()["rank"], 2)
+
+    def test_unranked_player_is_404(self):
+        self.assertEqual(self.client.get("/leaderboard/nobody/").status_code, 404)
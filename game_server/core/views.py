@@ -1,3 +1,50 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from . import leaderboard
+
+_cache = leaderboard.TTLCache(ttl=getattr(settings, "LEADERBOARD_CACHE_SECONDS", 5))
+
+
+def _int_param(request, name, default, upper):
+    try:
+        return max(0, min(int(request.GET.get(name, default)), upper))
+    except ValueError:
+        return default
+
+
+def _cached_response(request, key, build):
+    cached = _cache.get(key)
+    if cached is None:
+        data = build()
+        if data is None:
+            return JsonResponse({"error": "not ranked"}, status=404)
+        cached = _cache.set(key, data)
+    body, etag = cached
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={_cache.ttl}"
+    return response
+
+
+@require_GET
+def leaderboard_top(request):
+    limit = _int_param(request, "limit", 10, 100) or 10
+    offset = _int_param(request, "offset", 0, 1_000_000)
+    return _cached_response(
+        request, ("top", limit, offset),
+        lambda: leaderboard.top(limit=limit, offset=offset),
+    )
+
+
+@require_GET
+def leaderboard_player(request, player_id):
+    radius = _int_param(request, "radius", 5, 50)
+    return _cached_response(
+        request, ("around", player_id, radius),
+        lambda: leaderboard.around(player_id, radius=radius),
+    )
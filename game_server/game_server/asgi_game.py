@@ -0,0 +1,63 @@
+"""
+ASGI entry point for game-only workers.
+
+Serves just the game websocket route, without AuthMiddlewareStack (the
+consumer never looks at ``scope["user"]``, so there is no session or user
+lookup per connect) and with the trimmed app list from settings_game.py.
+Django is set up lazily: on the lifespan startup event where the server
+sends one (uvicorn), otherwise on the first connection (daphne). HTTP
+requests get a bare 404; admin and the leaderboard stay on game_server.asgi.
+
+    DJANGO_SETTINGS_MODULE=game_server.settings_game \\
+        uvicorn --host 0.0.0.0 --port 3005 --ws websockets-sansio game_server.asgi_game:application
+"""
+
+import os
+import threading
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game_server.settings_game")
+
+_router = None
+_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _lock:
+            if _router is None:
+                import django
+
+                django.setup(set_prefix=False)
+
+                from channels.routing import URLRouter
+
+                import core.routing
+
+                _router = URLRouter(core.routing.websocket_urlpatterns)
+    return _router
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            get_router()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await get_router()(scope, receive, send)
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] == "http":
+        await send({
+            "type": "http.response.start",
+            "status": 404,
+            "headers": [(b"content-type", b"text/plain")],
+        })
+        await send({"type": "http.response.body", "body": b"Not found"})
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -81,6 +82,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Result writers of several workers may wait on SQLite's write lock
+        "OPTIONS": {"timeout": 20},
     }
 }
 
@@ -127,12 +130,114 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
+REDIS_URL = os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# SINGLE_NODE=1 runs one worker with no Redis at all: in-process game store
+# and channel layer, no leaderboard
+SINGLE_NODE = os.environ.get("SINGLE_NODE", "0") == "1"
+
 # Channel layer using Redis
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": [REDIS_URL],
         },
     },
-}
\ No newline at end of file
+}
+
+# Matchmaking queue, game state and chat streams (see core/store.py)
+GAME_STORE = {
+    "BACKEND": "core.store.RedisStore",
+    "OPTIONS": {
+        "url": REDIS_URL,
+        "max_connections": int(os.environ.get("REDIS_MAX_CONNECTIONS", "100")),
+    },
+}
+
+LEADERBOARD_ENABLED = True
+
+if SINGLE_NODE:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    GAME_STORE = {"BACKEND": "core.store.MemoryStore"}
+    LEADERBOARD_ENABLED = False
+
+
+# Consumer profiling (see core/profiling.py). Toggle on a running worker
+# with `kill -USR1 <pid>`, dump the report with `kill -USR2 <pid>`.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILING_SLOW_MS = float(os.environ.get("PROFILING_SLOW_MS", "50"))
+
+# Largest websocket text frame a client may send; bigger frames are dropped
+WS_MAX_FRAME_LENGTH = 4096
+
+# Admission control and slow-consumer protection (see core/outbound.py).
+# Sockets past WS_MAX_CONNECTIONS per worker get "server_full" and are closed.
+# A client is dropped once more than WS_OUTBOUND_MAX_FRAMES frames wait for it
+# or a single send has been stuck for WS_SEND_STALL_SECONDS. Both need a server
+# whose send waits on a full socket buffer (uvicorn --ws websockets-sansio);
+# daphne buffers every send, so they never trigger under it.
+WS_MAX_CONNECTIONS = int(os.environ.get("WS_MAX_CONNECTIONS", "2000"))
+WS_OUTBOUND_MAX_FRAMES = 64
+WS_SEND_STALL_SECONDS = 5.0
+
+# Update interval hinted to clients in "connected" and "pong" frames; past
+# CLIENT_BUSY_LOAD of WS_MAX_CONNECTIONS the busy interval is hinted instead
+CLIENT_SEND_INTERVAL = 0.05
+CLIENT_SEND_INTERVAL_BUSY = 0.1
+CLIENT_BUSY_LOAD = 0.75
+
+# Spectators get each player's updates at most this often
+SPECTATOR_RATE_HZ = 10
+# How often a room re-reads its game's spectator count from the store; a
+# spectator joining on another worker waits at most this long for updates
+SPECTATOR_CHECK_SECONDS = 1.0
+
+# Match rooms (see core/rooms.py): ticks per second of rooms in play and of
+# rooms where nothing has moved for ROOM_IDLE_SECONDS. A match still open
+# MATCH_MAX_SECONDS after it started is recorded as finished.
+ROOM_TICK_HZ = 20
+ROOM_IDLE_TICK_HZ = 2
+ROOM_IDLE_SECONDS = 3.0
+MATCH_MAX_SECONDS = 90
+
+# Lag compensation (see core/lagcomp.py): samples of recent ball
+# positions kept per connection, the furthest back a kick claim is rewound
+# (seconds), and how far (px) outside a player's hitbox the ball may be
+LAGCOMP_HISTORY_SIZE = 64
+LAGCOMP_MAX_REWIND = 0.3
+LAGCOMP_REACH = 50
+
+# Chat limits and filter (see core/chat.py)
+CHAT_MAX_LENGTH = 200
+CHAT_RATE_LIMIT = 5  # messages...
+CHAT_RATE_PERIOD = 10  # ...per this many seconds, per connection
+CHAT_FILTER_WORDLIST = BASE_DIR / "core" / "chat_words.txt"
+CHAT_FILTER_RELOAD_SECONDS = 5
+
+# Chat history stream per game (see core/history.py)
+CHAT_HISTORY_MAXLEN = 500
+CHAT_HISTORY_PAGE_MAX = 50
+
+# Finished matches are written in batches by a background thread (see core/results.py)
+RESULTS_BATCH_SIZE = 50
+RESULTS_FLUSH_SECONDS = 2.0
+RESULTS_WRITE_ATTEMPTS = 4  # tries per write when the database is locked...
+RESULTS_RETRY_SECONDS = 0.5  # ...waiting this long before the first retry, doubled after each
+
+# Leaderboard responses are cached in-process for this long (see core/views.py)
+LEADERBOARD_CACHE_SECONDS = 5
+
+# Redis keys of a game expire this long after the match is created
+GAME_TTL_SECONDS = 60 * 60
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core": {"handlers": ["console"], "level": "INFO"},
+    },
+}
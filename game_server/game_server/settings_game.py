@@ -0,0 +1,23 @@
+"""
+Settings for game-only workers (see game_server/asgi_game.py).
+
+Same as settings.py, minus everything the websocket consumer never uses:
+admin, auth, sessions, messages, static files, middleware and templates.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    "channels",
+    "core",
+]
+
+MIDDLEWARE = []
+
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
+
+ROOT_URLCONF = "game_server.urls_game"
+
+ASGI_APPLICATION = "game_server.asgi_game.application"
@@ -15,9 +15,19 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 
+from core import views
+
 urlpatterns = [
     path("admin/", admin.site.urls),
 ]
+
+# The leaderboard lives in Redis; without it (SINGLE_NODE) the routes 404
+if settings.LEADERBOARD_ENABLED:
+    urlpatterns += [
+        path("leaderboard/", views.leaderboard_top, name="leaderboard-top"),
+        path("leaderboard/<str:player_id>/", views.leaderboard_player, name="leaderboard-player"),
+    ]
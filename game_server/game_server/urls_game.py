@@ -0,0 +1,5 @@
+"""
+Game-only workers serve no HTTP routes; see game_server/asgi_game.py.
+"""
+
+urlpatterns = []